@@ -35,6 +35,10 @@ if __name__ == "__main__":
             "log.access_file": "access.log",
             "log.error_file": "error.log",
             "server.shutdown_timeout": 1,
+            # each leaderboard stream holds a thread while it is open, the others
+            # are left to the regular requests
+            "server.thread_pool": flask_app.config["SERVER_THREADS"]
+            + flask_app.config["SSE_MAX_CLIENTS"],
         }
     )
 
@@ -1,33 +1,101 @@
-import json
-import pandas as pd
+import csv
+import hashlib
+import os
+import threading
+import time
+import traceback
+from collections import namedtuple
+
+# `signature` identifies the version of the roster file the mappings were read from
+RosterState = namedtuple("RosterState", ["signature", "mapping", "reverse_mapping"])
+
+
+def hash_key(api_key):
+    return hashlib.sha256(api_key.encode()).hexdigest()
 
 
 class ApiAuth:
-    def __init__(self, roster_file):
-        self.roster_df = pd.read_csv(
-            roster_file,
-            sep="\t",
-            header=0,
-            dtype=dict(
-                student_id=object, last_name=object, email=object, private_key=object
-            ),
-        )
-        self.mapping = {
-            student_id: api_key
-            for student_id, api_key in zip(
-                self.roster_df.student_id, self.roster_df.private_key
-            )
-        }
-        self.reverse_mapping = {v: k for k, v in self.mapping.items()}
+    """
+    API keys of the roster file, reloaded when the file changes.
+
+    Each version of the file is read into a new immutable state, swapped in with a
+    single assignment: lookups read the current state without locking. With
+    `reload_interval` a daemon thread checks the file every `reload_interval` seconds.
+    With `hash_keys` only the SHA-256 digests of the keys are kept in memory.
+    """
+
+    def __init__(self, roster_file, hash_keys=False, reload_interval=None):
+        self.roster_file = roster_file
+        self.hash_keys = hash_keys
+        self._lock = threading.Lock()
+        self._state = self._load(self._signature())
+
+        if reload_interval:
+            threading.Thread(
+                target=self._watch, args=(reload_interval,), daemon=True
+            ).start()
+
+    def _signature(self):
+        stat = os.stat(self.roster_file)
+        return stat.st_mtime_ns, stat.st_size
+
+    def _load(self, signature):
+        with open(self.roster_file, newline="") as f:
+            mapping = {
+                row["student_id"]: (
+                    hash_key(row["private_key"])
+                    if self.hash_keys
+                    else row["private_key"]
+                )
+                for row in csv.DictReader(f, delimiter="\t")
+                # an empty key would let an empty api_key log in as that student
+                if row["student_id"] and row["private_key"]
+            }
+        return RosterState(signature, mapping, {v: k for k, v in mapping.items()})
+
+    def reload(self):
+        """Reads the roster file again if it changed, returns True if it did."""
+        with self._lock:
+            signature = self._signature()
+            if signature == self._state.signature:
+                return False
+            self._state = self._load(signature)
+
+        print(f"Roster file '{self.roster_file}' reloaded: {len(self.mapping)} users.")
+        return True
+
+    def _watch(self, interval):
+        while True:
+            time.sleep(interval)
+            try:
+                self.reload()
+            except Exception:
+                # keep serving the last valid roster if the file is being replaced
+                traceback.print_exc()
+
+    @property
+    def mapping(self):
+        return self._state.mapping
+
+    @property
+    def reverse_mapping(self):
+        return self._state.reverse_mapping
+
+    def _lookup_key(self, api_key):
+        if self.hash_keys and api_key is not None:
+            return hash_key(api_key)
+        return api_key
 
     def is_valid_key(self, api_key):
-        return api_key in self.reverse_mapping
+        return self._lookup_key(api_key) in self.reverse_mapping
 
     def is_valid_user(self, user):
         return user in self.mapping
 
     def get_user(self, api_key):
-        return self.reverse_mapping.get(api_key, None)
+        return self.reverse_mapping.get(self._lookup_key(api_key), None)
 
     def get_api_key(self, user):
+        if self.hash_keys:
+            raise Exception("API keys are stored hashed: they cannot be retrieved.")
         return self.mapping.get(user, None)
@@ -1,29 +1,48 @@
+import gzip
 import traceback
 from flask import Flask, session, redirect, url_for
-from flask import render_template, request
+from flask import render_template, request, jsonify, make_response, Request, Response
 from flask_cors import CORS
 import competition_tools
+import db_engine
+import leaderboard_history
+import migrations
 import os
 import secrets
+import threading
 from api_utils import ApiAuth
-from models import db, Submission, Evaluation
+from models import db, Submission, Evaluation, SubmissionStatus
+from evaluation_queue import EvaluationQueue
+from leaderboard_cache import LeaderboardCache
+from leaderboard_feed import LeaderboardFeed
+from dashboard_analytics import DashboardAnalytics, load_evaluations
+from rank_index import LeaderboardIndex
+from quota_tracker import QuotaTracker
 from competition_tools import (
-    eval_public_private,
     StageHandler,
-    get_private_leaderboard,
-    get_public_leaderboard,
+    get_public_intervals,
     score_mapper,
 )
-from evaluation_functions import evaluator_name, to_maximize
-from sqlalchemy import func
-from datetime import datetime
-import pandas as pd
+from evaluation_functions import evaluator_name, primary_metric, to_maximize
+from datetime import datetime, timezone
 import numpy as np
-from scipy.stats import trim_mean
+import pandas as pd
+
+
+class SubmissionRequest(Request):
+    """Uploaded files are checked while they are received, see SubmissionSpool."""
+
+    def _get_file_stream(
+        self, total_content_length, content_type, filename=None, content_length=None
+    ):
+        return competition_tools.SubmissionSpool(solution_store.get())
 
 
 app = Flask(__name__, static_url_path="", static_folder="static")
+app.request_class = SubmissionRequest
 app.config.from_object("config.CompetitionConfig")
+# larger requests are rejected from their Content-Length, before reading the body
+app.config["MAX_CONTENT_LENGTH"] = app.config["MAX_FILE_SIZE"]
 app.secret_key = os.urandom(24)
 
 CORS(app)
@@ -31,14 +50,104 @@ CORS(app)
 stage_handler = StageHandler(
     app.config["OPEN_TIME"], app.config["CLOSE_TIME"], app.config["TERMINATE_TIME"]
 )
-api_auth = ApiAuth(app.config["API_FILE"])
+api_auth = ApiAuth(
+    app.config["API_FILE"],
+    hash_keys=app.config["HASH_API_KEYS"],
+    reload_interval=app.config["API_FILE_RELOAD_INTERVAL"],
+)
 app.config["SQLALCHEMY_DATABASE_URI"] = app.config["DB_FILE"]
-db.init_app(app)
+db_engine.init_app(app, db)
 db.app = app
 db.create_all()
+migrations.upgrade(db.engine)
+competition_tools.rebuild_user_summaries(
+    db, stage_handler.close_time, maximized_score=to_maximize
+)
+leaderboard_history.backfill(db, maximized_score=to_maximize)
 
 # Sanity checks
 competition_tools.check_solution_file(app.config["TEST_FILE_PATH"])
+solution_store = competition_tools.SolutionStore(app.config["TEST_FILE_PATH"])
+leaderboard_cache = LeaderboardCache()
+quota_tracker = QuotaTracker(
+    app.config["TIME_BETWEEN_SUBMISSIONS"], app.config["MAX_NUMBER_SUBMISSIONS"]
+)
+quota_tracker.warm(db)
+leaderboard_index = LeaderboardIndex(
+    stage_handler.close_time, maximized_score=to_maximize
+)
+leaderboard_index.rebuild(db)
+leaderboard_feed = LeaderboardFeed(
+    buffer_size=app.config["SSE_BUFFER_SIZE"],
+    max_clients=app.config["SSE_MAX_CLIENTS"],
+    heartbeat=app.config["SSE_HEARTBEAT"],
+    max_duration=app.config["SSE_MAX_DURATION"],
+    retry=app.config["SSE_RETRY"],
+)
+# the public table is rendered with the id of the last delta it includes: the index
+# is updated and the delta published at once
+leaderboard_update_lock = threading.Lock()
+
+
+def store_evaluation_status(submission_id, status, scores):
+    with app.app_context():
+        submission = db.session.get(Submission, submission_id)
+        submission.status = status
+        user_id, timestamp = submission.user_id, submission.timestamp
+        if status == SubmissionStatus.SCORED:
+            public_score, private_score = scores.metrics[primary_metric]
+            competition_tools.record_evaluation(
+                db,
+                submission,
+                public_score,
+                private_score,
+                maximized_score=to_maximize,
+                metrics=scores.metrics,
+                bootstrap=scores.bootstrap,
+            )
+        db.session.commit()
+
+    if status == SubmissionStatus.SCORED:
+        with leaderboard_update_lock:
+            moved = leaderboard_index.record(
+                user_id, timestamp, public_score, private_score
+            )
+            if moved is not None:
+                previous_rank, rank = moved
+                leaderboard_feed.publish(
+                    "delta",
+                    user_id=user_id,
+                    score=score_mapper(public_score),
+                    rank=rank,
+                    previous_rank=previous_rank,
+                )
+        leaderboard_cache.invalidate()
+    elif status == SubmissionStatus.FAILED:
+        # failed submissions do not count for the user
+        quota_tracker.release(user_id)
+
+
+evaluation_queue = EvaluationQueue(
+    app.config["TEST_FILE_PATH"],
+    on_status=store_evaluation_status,
+    workers=app.config["EVALUATION_WORKERS"],
+    max_pending=app.config["EVALUATION_QUEUE_SIZE"],
+)
+
+# Submissions left in the queue by a previous run are evaluated again
+for pending_submission in Submission.query.filter(
+    Submission.status.in_([SubmissionStatus.QUEUED, SubmissionStatus.RUNNING])
+).all():
+    try:
+        evaluation_queue.submit(
+            pending_submission.id,
+            competition_tools.read_predictions(
+                pending_submission.filename, solution_store.get()
+            ),
+        )
+    except Exception as ex:
+        traceback.print_exc()
+        store_evaluation_status(pending_submission.id, SubmissionStatus.FAILED, None)
 
 # Scheduling database dumps
 competition_tools.schedule_db_dump(
@@ -46,12 +155,16 @@ competition_tools.schedule_db_dump(
     db,
     stage_name="CLOSE",
     dump_out=app.config["DUMP_FOLDER"],
+    dump_format=app.config["DUMP_FORMAT"],
+    chunk_size=app.config["DUMP_CHUNK_SIZE"],
 )
 competition_tools.schedule_db_dump(
     app.config["TERMINATE_TIME"],
     db,
     stage_name="TERMINATE",
     dump_out=app.config["DUMP_FOLDER"],
+    dump_format=app.config["DUMP_FORMAT"],
+    chunk_size=app.config["DUMP_CHUNK_SIZE"],
 )
 
 
@@ -104,108 +217,32 @@ def student_dashboard(user_id=None):
         traceback.print_exc()
         return redirect(url_for("error", error_message=ex))
 
-    pub_leader = competition_tools.get_public_leaderboard(db)
-    priv_leader = competition_tools.get_private_leaderboard(db, stage_handler)
-
-    pub_leader_df = pd.DataFrame(pub_leader, columns=["user_id", "public"])
-    priv_leader_df = pd.DataFrame(priv_leader, columns=["user_id", "private"])
-
-    # TODO manage empty leaderboard
-    pub_priv_leader_df = pd.merge(
-        pub_leader_df, priv_leader_df, on="user_id", validate="one_to_one"
+    # computed for all the users at once, until the next evaluation or selection
+    analytics = leaderboard_cache.get(
+        "dashboard",
+        lambda: DashboardAnalytics(
+            load_evaluations(db),
+            leaderboard_index.private_leaderboard(),
+            maximized_score=to_maximize,
+        ),
     )
 
     if user_id is None:
         return render_template(
             "student_dashboard.html",
             user_id=user_id,
-            leaderboard=pub_priv_leader_df.to_dict(orient="index"),
+            leaderboard=analytics.leaderboard,
             selected_user_id=user_id,
         )
 
     else:
         try:
-            if user_id not in pub_priv_leader_df["user_id"].values:
-                raise Exception(f"User {user_id} not found.")
-
-            pub_position = (
-                np.where(
-                    pub_priv_leader_df.sort_values(["public"], ascending=False)[
-                        "user_id"
-                    ].values
-                    == user_id
-                )[0][0]
-                + 1
-            )
-            priv_position = (
-                np.where(
-                    pub_priv_leader_df.sort_values(["private"], ascending=False)[
-                        "user_id"
-                    ].values
-                    == user_id
-                )[0][0]
-                + 1
-            )
-
-            priv_score_on_leaderboard = pub_priv_leader_df.loc[
-                pub_position - 1, "private"
-            ]
-
-            user_scores = competition_tools.get_user_scores(
-                db, user_id, sort_descending=to_maximize
-            )
-
-            user_scores = pd.DataFrame(user_scores).rename(
-                {0: "user_id", 1: "timestamp", 2: "public", 3: "private"}, axis=1
-            )
-            user_scores["public"] = user_scores["public"].astype(float)
-            user_scores["private"] = user_scores["private"].astype(float)
-
-            user_scores = user_scores.replace([np.inf, -np.inf], np.nan)
-
-            n_submissions = len(user_scores)
-
-            max_public = competition_tools.score_mapper(user_scores["public"].max())
-            avg_public = competition_tools.score_mapper(
-                trim_mean(user_scores["public"], 0.1)
-            )
-            std_public = competition_tools.score_mapper(user_scores["public"].std())
-
-            max_private = competition_tools.score_mapper(user_scores["private"].max())
-            avg_private = competition_tools.score_mapper(
-                trim_mean(user_scores["private"], 0.1)
-            )
-            std_private = competition_tools.score_mapper(user_scores["private"].std())
-
-            user_scores_sub_freq = user_scores.copy()
-            # user_scores_sub_freq["timestamp"] = pd.to_datetime(user_scores["timestamp"])
-
-            user_scores_sub_freq = (
-                user_scores_sub_freq.groupby(pd.Grouper(key="timestamp", freq="1D"))
-                .size()
-                .to_frame()
-                .rename({0: "count"}, axis=1)
-                .reset_index()
-            )
-
-            # compute KPI
             return render_template(
                 "student_dashboard.html",
                 user_id=user_id,
-                leaderboard=pub_priv_leader_df.to_dict(orient="index"),
+                leaderboard=analytics.leaderboard,
                 selected_user_id=user_id,
-                pub_position=pub_position,
-                priv_position=priv_position,
-                priv_score_on_leaderboard=priv_score_on_leaderboard,
-                n_submissions=n_submissions,
-                max_public=max_public,
-                avg_public=avg_public,
-                std_public=std_public,
-                max_private=max_private,
-                avg_private=avg_private,
-                std_private=std_private,
-                user_scores=user_scores.to_json(orient="index"),
-                user_scores_sub_freq=user_scores_sub_freq.to_json(orient="index"),
+                **analytics.user_kpis(user_id),
             )
         except Exception as ex:
             traceback.print_stack()
@@ -216,6 +253,24 @@ def student_dashboard(user_id=None):
             #                        error=str(ex))
 
 
+def leaderboard_timeline():
+    """The public leaderboard summarized at evenly spaced times since the opening."""
+    end = min(datetime.utcnow(), stage_handler.terminate_time)
+    if end <= stage_handler.open_time:
+        return []
+    times = pd.date_range(
+        stage_handler.open_time, end, periods=app.config["LEADERBOARD_TIMELINE_POINTS"]
+    ).to_pydatetime()
+    points = leaderboard_history.timeline(db, times, maximized_score=to_maximize)
+    for point in points:
+        point["time"] = point["time"].strftime("%Y-%m-%d %H:%M:%S")
+        for key in ["best", "median"]:
+            # undefined and infinite scores are gaps of the charts
+            if point[key] is not None and not np.isfinite(point[key]):
+                point[key] = None
+    return points
+
+
 @app.route("/general_dashboard", methods=["GET"])
 def general_dashboard():
     try:
@@ -230,8 +285,8 @@ def general_dashboard():
         return redirect(url_for("error", error_message=ex))
 
     try:
-        pub_leader = competition_tools.get_public_leaderboard(db)
-        priv_leader = competition_tools.get_private_leaderboard(db, stage_handler)
+        pub_leader = leaderboard_index.public_leaderboard()
+        priv_leader = leaderboard_index.private_leaderboard()
         pub_leader_df = pd.DataFrame(pub_leader, columns=["user_id", "public"])
         priv_leader_df = pd.DataFrame(priv_leader, columns=["user_id", "private"])
         pub_priv_leader_df = pd.merge(
@@ -297,6 +352,7 @@ def general_dashboard():
             baseline_info=baseline_info.to_json(orient="index")
             if baseline_info is not None
             else None,
+            timeline=leaderboard_cache.get("timeline", leaderboard_timeline),
         )
 
     except Exception as ex:
@@ -357,7 +413,14 @@ def update_submissions():
             if e.submission_id in checked_submission_ids:
                 e.private_check = True
 
+        db.session.flush()
+        best_private_selected = competition_tools.update_selected_private(
+            db, user_id, stage_handler.close_time, maximized_score=to_maximize
+        )
         db.session.commit()
+        leaderboard_index.select(user_id, best_private_selected)
+        # the private ranking of the dashboard depends on the selections
+        leaderboard_cache.invalidate()
         return render_template("update_submissions.html", with_success=with_success)
 
     except Exception as ex:
@@ -416,8 +479,6 @@ def submissions():
                 f"Received request to check submissions page by user_id '{user_id}'."
             )
 
-            Submission.query.filter_by(user_id=user_id).all()
-
             user_submissions = (
                 db.session.query(
                     Submission.id,
@@ -436,10 +497,7 @@ def submissions():
                 for s_id, timestamp, user_id, score, check in user_submissions
             ]
 
-            submissions_left = int(
-                app.config["MAX_NUMBER_SUBMISSIONS"]
-                - competition_tools.get_user_submissions_number(user_id=user_id, db=db)
-            )
+            submissions_left = quota_tracker.submissions_left(user_id)
 
             return render_template(
                 "submissions.html",
@@ -461,6 +519,75 @@ def submissions():
 ################
 
 
+def render_leaderboard_table(
+    participants,
+    intervals=None,
+    next_cursor=None,
+    neighbourhood=None,
+    last_event_id=None,
+):
+    return render_template(
+        "includes/_leaderboard_table.html",
+        participants=participants,
+        intervals=intervals,
+        next_cursor=next_cursor,
+        neighbourhood=neighbourhood,
+        last_event_id=last_event_id,
+        evaluator_name=evaluator_name,
+    )
+
+
+def public_intervals(start, rows):
+    # the intervals were computed once per submission, only the pairs are compared
+    # here (the next user is needed for the last row)
+    participants = leaderboard_index.public_leaderboard(start, start + len(rows) + 1)
+    return get_public_intervals(db, participants, maximized_score=to_maximize)
+
+
+def render_public_leaderboard_table(highlight_user_id=None):
+    """
+    The first page of the public leaderboard, and the rows around `highlight_user_id`.
+
+    The live updates of the page resume from the last delta included in the rows.
+    """
+    with leaderboard_update_lock:
+        last_event_id = leaderboard_feed.last_event_id
+        _, participants, next_cursor = leaderboard_index.page(
+            "public", limit=app.config["LEADERBOARD_PAGE_SIZE"]
+        )
+        neighbourhood = None
+        if highlight_user_id is not None:
+            neighbourhood = leaderboard_index.public_neighbourhood(
+                highlight_user_id, app.config["LEADERBOARD_NEIGHBOURHOOD"]
+            )
+
+    intervals = public_intervals(0, participants)
+    if neighbourhood is not None:
+        intervals.update(public_intervals(*neighbourhood))
+
+    return render_leaderboard_table(
+        participants, intervals, next_cursor, neighbourhood, last_event_id
+    )
+
+
+def accepts_gzip():
+    return "gzip" in request.accept_encodings
+
+
+def gzip_response(response):
+    """Compresses the body of `response` if the client accepts it."""
+    response.vary.add("Accept-Encoding")
+    if (
+        response.status_code == 200
+        and accepts_gzip()
+        and "Content-Encoding" not in response.headers
+        and response.content_length >= app.config["GZIP_MIN_SIZE"]
+    ):
+        response.set_data(gzip.compress(response.get_data(), compresslevel=6))
+        response.headers["Content-Encoding"] = "gzip"
+    return response
+
+
 @app.route("/", methods=["GET"])
 def leaderboard():
     try:
@@ -487,10 +614,39 @@ def leaderboard():
         ) and stage_handler.is_terminated():
             return render_template("over.html", name=app.config["NAME"])
         else:
-            participants = get_public_leaderboard(db, maximized_score=to_maximize)
+            leaderboard_table = leaderboard_cache.get(
+                "table", render_public_leaderboard_table
+            )
+            is_closed = stage_handler.is_closed()
+
+            if not request.args:
+                # Anonymous views are all the same: serve them from the cache
+                page = leaderboard_cache.get(
+                    ("page", is_closed),
+                    lambda: render_template(
+                        "leaderboard.html",
+                        name=app.config["NAME"],
+                        leaderboard_table=leaderboard_table,
+                        can_submit=True,
+                        live_updates=True,
+                        close_time=stage_handler.close_time,
+                        is_closed=is_closed,
+                    ),
+                )
+                response = make_response(page)
+                response.set_etag(leaderboard_cache.etag(is_closed, accepts_gzip()))
+                response.last_modified = leaderboard_cache.last_modified
+                response.cache_control.no_cache = True
+                return gzip_response(response.make_conditional(request))
+
             score = request.args.get("score")
             highlight_user_id = request.args.get("highlight")
 
+            # beyond the first page, the rows around the user are shown too
+            rank = leaderboard_index.public_rank(highlight_user_id)
+            if rank is not None and rank > app.config["LEADERBOARD_PAGE_SIZE"]:
+                leaderboard_table = render_public_leaderboard_table(highlight_user_id)
+
             if score:
                 try:
                     score = competition_tools.score_mapper(float(score))
@@ -498,17 +654,21 @@ def leaderboard():
                     score = None
 
             left = request.args.get("left", None)
-            return render_template(
-                "leaderboard.html",
-                name=app.config["NAME"],
-                score=score,
-                highlight_user_id=highlight_user_id,
-                participants=participants,
-                can_submit=True,
-                close_time=stage_handler.close_time,
-                is_closed=stage_handler.is_closed(),
-                left=left,
-                evaluator_name=evaluator_name,
+            return gzip_response(
+                make_response(
+                    render_template(
+                        "leaderboard.html",
+                        name=app.config["NAME"],
+                        score=score,
+                        highlight_user_id=highlight_user_id,
+                        leaderboard_table=leaderboard_table,
+                        can_submit=True,
+                        live_updates=True,
+                        close_time=stage_handler.close_time,
+                        is_closed=is_closed,
+                        left=left,
+                    )
+                )
             )
 
     except Exception as ex:
@@ -517,6 +677,121 @@ def leaderboard():
         return redirect(url_for("error", error_message=ex))
 
 
+@app.route("/leaderboard/stream", methods=["GET"])
+def leaderboard_stream():
+    """Server-Sent Events of the public leaderboard changes, see LeaderboardFeed."""
+    if stage_handler.is_ready() or stage_handler.is_terminated():
+        return "", 204  # the clients stop reconnecting
+
+    # the page opens the stream from the last delta of its table, the browser
+    # resumes it from the last event received
+    last_event_id = request.headers.get("Last-Event-ID") or request.args.get(
+        "last_event_id"
+    )
+    response = Response(
+        leaderboard_feed.stream(last_event_id), mimetype="text/event-stream"
+    )
+    response.cache_control.no_cache = True
+    response.headers["X-Accel-Buffering"] = "no"  # not buffered by nginx proxies
+    return response
+
+
+@app.route("/api/leaderboard", methods=["GET"])
+def api_leaderboard():
+    """
+    A page of the leaderboard as JSON: {"rows": [[rank, user_id, score]], "next": cursor}.
+
+    The next page is requested with `after=<next>` (keyset pagination), `limit` sets
+    the rows per page. The private leaderboard (`board=private`) is only served to
+    the admin.
+    """
+    try:
+        user_id = None
+        api_key = request.args.get("api_key", None)
+        if api_key is not None:
+            user_id = get_user_id(api_key)
+        is_admin = user_id == app.config["ADMIN_USER_ID"]
+
+        board = request.args.get("board", "public")
+        if board not in ["public", "private"]:
+            raise Exception(f"Unknown leaderboard '{board}'.")
+        hidden = stage_handler.is_ready() or stage_handler.is_terminated()
+        if not is_admin and (board == "private" or hidden):
+            raise Exception("This leaderboard is not available.")
+
+        limit = int(request.args.get("limit", app.config["LEADERBOARD_PAGE_SIZE"]))
+        if not 0 < limit <= app.config["LEADERBOARD_MAX_PAGE_SIZE"]:
+            raise Exception(
+                f"The limit must be between 1 and {app.config['LEADERBOARD_MAX_PAGE_SIZE']}."
+            )
+        cursor = request.args.get("after", None)
+
+        start, rows, next_cursor = leaderboard_index.page(board, cursor, limit)
+        response = jsonify(
+            rows=[
+                [start + position, participant, score]
+                for position, (participant, score) in enumerate(rows, 1)
+            ],
+            next=next_cursor,
+        )
+        response.set_etag(
+            leaderboard_cache.etag("api", board, cursor, limit, accepts_gzip())
+        )
+        response.last_modified = leaderboard_cache.last_modified
+        response.cache_control.no_cache = True
+        response.cache_control.private = board == "private"
+        return gzip_response(response.make_conditional(request))
+
+    except Exception as ex:
+        traceback.print_stack()
+        traceback.print_exc()
+        return jsonify(error=str(ex)), 400
+
+
+@app.route("/api/leaderboard/history", methods=["GET"])
+def api_leaderboard_history():
+    """
+    The public leaderboard as of a past time, for the admin: {"rows": [[rank, user_id, score]]}.
+
+    `as_of` is a UTC time formatted as in the config ("%Y/%m/%d %H:%M:%S") or in ISO 8601.
+    """
+    try:
+        user_id = None
+        api_key = request.args.get("api_key", None)
+        if api_key is not None:
+            user_id = get_user_id(api_key)
+        if user_id != app.config["ADMIN_USER_ID"]:
+            raise Exception("The leaderboard history is only available to the admin.")
+
+        as_of = request.args.get("as_of", None)
+        if as_of is None:
+            raise Exception("The as_of time is missing.")
+        try:
+            time = datetime.strptime(as_of, "%Y/%m/%d %H:%M:%S")
+        except ValueError:
+            try:
+                time = datetime.fromisoformat(as_of)
+            except ValueError:
+                raise Exception(f"Invalid as_of time '{as_of}'.")
+            if time.tzinfo is not None:
+                time = time.astimezone(timezone.utc).replace(tzinfo=None)
+
+        board = leaderboard_history.board_as_of(db, time, maximized_score=to_maximize)
+        response = jsonify(
+            rows=[
+                [rank, participant, score_mapper(score)]
+                for rank, (participant, score) in enumerate(board, 1)
+            ]
+        )
+        response.cache_control.private = True
+        return gzip_response(response)
+
+    except Exception as ex:
+        traceback.print_stack()
+        traceback.print_exc()
+        return jsonify(error=str(ex)), 400
+
+
 ###################
 # final leaderboard
 ###################
@@ -542,12 +817,12 @@ def fleaderboard():
     if (user_id is None) or (user_id not in [app.config["ADMIN_USER_ID"]]):
         return redirect(url_for("leaderboard"))
 
-    participants = get_private_leaderboard(
-        db, stage_handler, maximized_score=to_maximize
-    )
+    participants = leaderboard_index.private_leaderboard()
 
     return render_template(
-        "leaderboard.html", participants=participants, can_submit=False
+        "leaderboard.html",
+        leaderboard_table=render_leaderboard_table(participants),
+        can_submit=False,
     )
 
 
@@ -565,79 +840,54 @@ def show_evaluate_score():
 
 
 ################
-# Evaluate
+# Submission status
 ################
-@app.route("/evaluate", methods=["GET"])
-def evaluate():
+@app.route("/submission_status", methods=["GET"])
+def submission_status():
     try:
         api_key = request.args.get("api_key")
         user_id = get_user_id(api_key)
 
-        if (
-            user_id not in [app.config["ADMIN_USER_ID"], app.config["BASELINE_USER_ID"]]
-        ) and (not stage_handler.can_submit()):
-            return redirect(url_for("leaderboard"))
-        else:
+        submission = Submission.query.filter_by(
+            id=request.args.get("submission_id"), user_id=user_id
+        ).first()
+        if not submission:
+            raise Exception("Submission not found!")
 
-            submission_id = request.args.get("submission_id")
-            submission = Submission.query.filter_by(
-                id=submission_id, user_id=user_id
-            ).first()
-            public_score, private_score = eval_public_private(
-                submission.filename, app.config["TEST_FILE_PATH"]
-            )
-            if not submission:
-                # not found!
-                raise Exception("Submission not found!")
-
-            if user_id == app.config["ADMIN_USER_ID"]:
-                return redirect(
-                    url_for(
-                        "show_evaluate_score",
-                        pub_score=public_score,
-                        priv_score=private_score,
-                        baseline=0,
-                    )
+        status = dict(submission_id=submission.id, status=submission.status)
+
+        if submission.status == SubmissionStatus.SCORED:
+            evaluation = submission.evaluation[0]
+            public_score = float(evaluation.evaluation_public)
+
+            if user_id == app.config["BASELINE_USER_ID"]:
+                status["redirect"] = url_for(
+                    "show_evaluate_score",
+                    pub_score=public_score,
+                    priv_score=float(evaluation.evaluation_private),
+                    baseline=1,
                 )
             else:
-                evaluation = Evaluation(
-                    submission=submission,
-                    evaluation_public=public_score,
-                    evaluation_private=private_score,
+                submissions_left = quota_tracker.submissions_left(user_id)
+                status["redirect"] = url_for(
+                    "leaderboard",
+                    score=public_score,
+                    highlight=user_id,
+                    left=submissions_left,
                 )
-                db.session.add(evaluation)
-                db.session.commit()
 
-                if user_id == app.config["BASELINE_USER_ID"]:
-                    return redirect(
-                        url_for(
-                            "show_evaluate_score",
-                            pub_score=public_score,
-                            priv_score=private_score,
-                            baseline=1,
-                        )
-                    )
-                else:
-                    submissions_left = int(
-                        app.config["MAX_NUMBER_SUBMISSIONS"]
-                        - competition_tools.get_user_submissions_number(
-                            user_id=user_id, db=db
-                        )
-                    )
+        elif submission.status == SubmissionStatus.FAILED:
+            status["error"] = (
+                "Unexpected error while evaluating your submission! "
+                "Please contact an administrator"
+            )
 
-                    return redirect(
-                        url_for(
-                            "leaderboard",
-                            score=public_score,
-                            highlight=user_id,
-                            left=submissions_left,
-                        )
-                    )
+        return jsonify(status)
 
     except Exception as ex:
         traceback.print_stack()
         traceback.print_exc()
-        return redirect(url_for("error", error_message=ex))
+        return jsonify(error=str(ex)), 400
 
 
 ################
@@ -645,6 +895,7 @@ def evaluate():
 ################
 @app.route("/upload", methods=["POST"])
 def upload():
+    reservation = None
     try:
         api_key = request.form.get("api_key", None)
         user_id = get_user_id(api_key)  # This will be stored in the Submissions table
@@ -667,43 +918,13 @@ def upload():
 
             # Save submitted solution
             if request.method == "POST":
-
-                latest_submission = (
-                    db.session.query(func.max(Submission.timestamp))
-                    .filter(Submission.user_id == user_id)
-                    .first()[0]
-                )
                 now = datetime.utcnow()
-
                 if user_id not in [
                     app.config["ADMIN_USER_ID"],
                     app.config["BASELINE_USER_ID"],
                 ]:
-
-                    if (
-                        latest_submission
-                        and (now - latest_submission).total_seconds()
-                        < app.config["TIME_BETWEEN_SUBMISSIONS"]
-                    ):
-                        delta = max(
-                            5,
-                            int(
-                                app.config["TIME_BETWEEN_SUBMISSIONS"]
-                                - (now - latest_submission).total_seconds()
-                            ),
-                        )  # avoid messages such as "try again in 0/1/2 seconds" (TODO remove magic number 5)
-                        raise Exception(
-                            f"You are exceeding the {app.config['TIME_BETWEEN_SUBMISSIONS']} seconds limit between submissions. Please try again in {delta} seconds"
-                        )
-
-                    n_submissions = competition_tools.get_user_submissions_number(
-                        user_id=user_id, db=db
-                    )
-                    if n_submissions >= app.config["MAX_NUMBER_SUBMISSIONS"]:
-                        raise Exception(
-                            f"You are exceeding the max submissions limit of {app.config['MAX_NUMBER_SUBMISSIONS']}. "
-                            f"You are no more allowed to submit any solution."
-                        )
+                    # checks the limits and books the submission in memory, atomically
+                    reservation = quota_tracker.reserve(user_id, now)
 
                 # check if the post request has the file part
                 if "submittedSolutionFile" not in request.files:
@@ -721,32 +942,63 @@ def upload():
                     error_message = "No selected file"
                     raise Exception(error_message)
 
-                if competition_tools.allowed_file(
-                    file.filename
-                ) and competition_tools.check_file(file, app.config["TEST_FILE_PATH"]):
+                if competition_tools.allowed_file(file.filename):
 
                     timestamp = competition_tools.get_timestamp()
                     new_file_name = f"{timestamp}_{user_id}.csv"
                     output_file = os.path.join(
                         app.config["UPLOAD_FOLDER"], new_file_name
                     )
-                    # we are reading the stream when checking the file, so we need to go back to the start
-                    file.stream.seek(0)
-                    file.save(output_file)
-                    submission = Submission(user_id=user_id, filename=output_file)
+
+                    if user_id == app.config["ADMIN_USER_ID"]:
+                        # Admin scores never reach the leaderboard: no need to queue them
+                        scores = competition_tools.process_submission(
+                            file, solution_store, output_file
+                        )
+                        submission = Submission(
+                            user_id=user_id,
+                            filename=output_file,
+                            status=SubmissionStatus.SCORED,
+                        )
+                        db.session.add(submission)
+                        db.session.commit()
+                        return redirect(
+                            url_for(
+                                "show_evaluate_score",
+                                pub_score=scores[0],
+                                priv_score=scores[1],
+                                baseline=0,
+                            )
+                        )
+
+                    y_pred = competition_tools.accept_submission(
+                        file, solution_store.get(), output_file
+                    )
+                    submission = Submission(
+                        user_id=user_id,
+                        timestamp=now,
+                        filename=output_file,
+                        status=SubmissionStatus.QUEUED,
+                    )
                     db.session.add(submission)
                     db.session.commit()
-                    # By passing api_key, we can later check that the user calling /evaluate
-                    # is the same that has made the submission
+                    submission_id = competition_tools.queue_submission(
+                        db, evaluation_queue, submission, y_pred
+                    )
+                    # stored: from now on only a failed evaluation gives the slot back
+                    reservation = None
+
+                    # By passing api_key, the submit page can poll the evaluation status
                     return redirect(
-                        url_for(
-                            "evaluate", submission_id=submission.id, api_key=api_key
-                        )
+                        url_for("submit", submission_id=submission_id, api_key=api_key)
                     )
                 else:
                     raise Exception("You should not be here!")
 
     except Exception as ex:
+        if reservation is not None:
+            # the upload was rejected: it does not count for the user
+            quota_tracker.release(user_id, reservation)
         traceback.print_stack()
         traceback.print_exc()
         return redirect(url_for("error", error_message=ex))
@@ -773,10 +1025,19 @@ def submit():
         else:
             submit_request_id = secrets.token_hex()
             session["submit_request_id"] = submit_request_id
+
+            status_url = None
+            submission_id = request.args.get("submission_id", None)
+            if submission_id is not None and api_key is not None:
+                status_url = url_for(
+                    "submission_status", submission_id=submission_id, api_key=api_key
+                )
+
             return render_template(
                 "submit.html",
                 submit_request_id=submit_request_id,
                 is_closed=stage_handler.is_closed(),
+                status_url=status_url,
             )
 
     except Exception as ex:
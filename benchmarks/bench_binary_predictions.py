@@ -0,0 +1,70 @@
+"""
+Time of reading a stored submission aligned with the solution layout: parsing and
+validating the csv file against memory-mapping its binary copy (.npy).
+
+    python benchmarks/bench_binary_predictions.py [--rows 1000000 10000000]
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.append(os.path.join(os.path.dirname(__file__), ".."))
+import competition_tools
+from competition_tools import INDEX, PUBLIC, TARGET
+
+
+def measure(read, *args):
+    start = time.perf_counter()
+    y_pred = read(*args)
+    return y_pred, time.perf_counter() - start
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, nargs="+", default=[1000000, 10000000])
+    args = parser.parse_args()
+
+    rng = np.random.RandomState(0)
+    for n_rows in args.rows:
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            solution_file = os.path.join(tmp_dir, "solution.csv")
+            pd.DataFrame(
+                {
+                    INDEX: np.arange(n_rows),
+                    TARGET: rng.randint(0, 2, n_rows),
+                    PUBLIC: rng.randint(0, 3, n_rows),
+                }
+            ).to_csv(solution_file, index=False)
+            solution = competition_tools.SolutionStore(solution_file).get()
+
+            submission_file = os.path.join(tmp_dir, "submission.csv")
+            ids = rng.permutation(n_rows)
+            y_pred = rng.randint(0, 2, n_rows)
+            pd.DataFrame({INDEX: ids, TARGET: y_pred}).to_csv(
+                submission_file, index=False
+            )
+
+            csv_pred, csv_time = measure(
+                competition_tools.read_predictions, submission_file, solution
+            )
+            competition_tools.save_predictions(
+                submission_file, solution.index, y_pred[np.argsort(ids)]
+            )
+            npy_pred, npy_time = measure(
+                competition_tools.read_predictions, submission_file, solution
+            )
+            assert np.array_equal(csv_pred, npy_pred)
+
+            csv_size = os.path.getsize(submission_file) / 1024 / 1024
+            npy_file = competition_tools.predictions_file(submission_file)
+            npy_size = os.path.getsize(npy_file) / 1024 / 1024
+
+            print(f"{n_rows} rows:")
+            print(f"    csv {csv_time:.3f} s ({csv_size:.0f} MB)")
+            print(f"    npy {npy_time:.3f} s ({npy_size:.0f} MB)")
@@ -0,0 +1,107 @@
+"""
+Parse time and peak memory of a submission file: the previous pandas path (type
+inference, Id as index, sort_index) against `read_submission` with each engine.
+
+    python benchmarks/bench_csv_parse.py [--rows 1000000 10000000]
+
+Every measurement runs in a new interpreter, which reports the growth of its peak
+resident memory (VmHWM) over the memory used after loading the solution.
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.append(os.path.join(os.path.dirname(__file__), ".."))
+import competition_tools
+from config import CompetitionConfig
+
+READERS = ["pandas (previous)", "read_submission c", "read_submission pyarrow"]
+
+
+def memory_kb(field):
+    with open("/proc/self/status") as f:
+        for line in f:
+            if line.startswith(field + ":"):
+                return int(line.split()[1])
+
+
+def measure(reader, solution_file, submission_file):
+    solution = competition_tools.SolutionStore(solution_file).get()
+    baseline = memory_kb("VmRSS")
+
+    start = time.perf_counter()
+    if reader == "pandas (previous)":
+        submitted_df = pd.read_csv(submission_file, index_col=competition_tools.INDEX)
+        y_pred = submitted_df.sort_index()[competition_tools.TARGET].values
+    else:
+        CompetitionConfig.SUBMISSION_CSV_ENGINE = reader.split()[-1]
+        ids, y_pred = competition_tools.read_submission(submission_file, solution)
+        y_pred = y_pred[np.argsort(ids)]
+    elapsed = time.perf_counter() - start
+
+    return dict(seconds=elapsed, peak_mb=(memory_kb("VmHWM") - baseline) / 1024)
+
+
+def write_files(tmp_dir, n_rows):
+    rng = np.random.RandomState(0)
+    ids = np.arange(n_rows)
+    solution_file = os.path.join(tmp_dir, "solution.csv")
+    pd.DataFrame(
+        {
+            competition_tools.INDEX: ids,
+            competition_tools.TARGET: rng.randint(0, 2, n_rows),
+            competition_tools.PUBLIC: rng.randint(0, 3, n_rows),
+        }
+    ).to_csv(solution_file, index=False)
+
+    submission_file = os.path.join(tmp_dir, "submission.csv")
+    pd.DataFrame(
+        {
+            competition_tools.INDEX: rng.permutation(ids),
+            competition_tools.TARGET: rng.randint(0, 2, n_rows),
+        }
+    ).to_csv(submission_file, index=False)
+    return solution_file, submission_file
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, nargs="+", default=[1000000, 10000000])
+    parser.add_argument("--worker", nargs=3, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        print(json.dumps(measure(*args.worker)))
+        sys.exit(0)
+
+    try:
+        import pyarrow
+    except ImportError:
+        READERS.remove("read_submission pyarrow")
+
+    for n_rows in args.rows:
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            solution_file, submission_file = write_files(tmp_dir, n_rows)
+            size_mb = os.path.getsize(submission_file) / 1024 / 1024
+            print(f"{n_rows} rows ({size_mb:.0f} MB):")
+
+            for reader in READERS:
+                output = subprocess.run(
+                    [sys.executable, __file__, "--worker"]
+                    + [reader, solution_file, submission_file],
+                    check=True,
+                    capture_output=True,
+                    text=True,
+                ).stdout
+                result = json.loads(output.splitlines()[-1])
+                print(
+                    f"    {reader:<24} {result['seconds']:.2f} s, "
+                    f"peak memory +{result['peak_mb']:.0f} MB"
+                )
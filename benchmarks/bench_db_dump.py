@@ -0,0 +1,88 @@
+"""
+Time and peak Python memory of the streaming table dump, for growing tables.
+
+    python benchmarks/bench_db_dump.py [--rows 100000 1000000] [--format csv]
+
+With streaming the peak memory stays the same whatever the number of rows; loading
+the table with pandas first grows with it.
+"""
+import argparse
+import datetime
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+from sqlalchemy import create_engine
+
+sys.path.append(os.path.join(os.path.dirname(__file__), ".."))
+import db_dump
+from models import db, Evaluation, Submission
+
+
+def populate(engine, n_rows, batch_size=50000):
+    db.metadata.create_all(engine)
+    start = datetime.datetime(2020, 1, 1)
+    with engine.begin() as conn:
+        for first in range(1, n_rows + 1, batch_size):
+            ids = range(first, min(first + batch_size, n_rows + 1))
+            conn.execute(
+                Submission.__table__.insert(),
+                [
+                    dict(
+                        id=i,
+                        user_id=f"user_{i % 500}",
+                        timestamp=start + datetime.timedelta(seconds=i),
+                        filename=f"{i}.csv",
+                    )
+                    for i in ids
+                ],
+            )
+            conn.execute(
+                Evaluation.__table__.insert(),
+                [
+                    dict(
+                        submission_id=i,
+                        evaluation_public=(i % 997) / 997,
+                        evaluation_private=(i % 991) / 991,
+                        timestamp=start + datetime.timedelta(seconds=i),
+                        private_check=False,
+                    )
+                    for i in ids
+                ],
+            )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, nargs="+", default=[100000, 1000000])
+    parser.add_argument(
+        "--format", type=str, default="csv", choices=db_dump.DUMP_FORMATS
+    )
+    parser.add_argument("--chunk-size", type=int, default=10000)
+    args = parser.parse_args()
+
+    for n_rows in args.rows:
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            engine = create_engine("sqlite:///" + os.path.join(tmp_dir, "bench.db"))
+            populate(engine, n_rows)
+
+            tracemalloc.start()
+            start = time.perf_counter()
+            db_dump.dump_table(
+                engine,
+                Evaluation.__table__,
+                os.path.join(tmp_dir, "evaluation.dump"),
+                args.format,
+                args.chunk_size,
+            )
+            elapsed = time.perf_counter() - start
+            _, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            engine.dispose()
+
+        print(
+            f"{n_rows:>9} rows ({args.format}): {elapsed:.2f} s, "
+            f"peak memory {peak / 1024 / 1024:.1f} MB"
+        )
@@ -0,0 +1,61 @@
+"""
+Time of computing several classification metrics on the same predictions: one
+sklearn call per metric against `compute_metrics`, which shares the class counts
+(true positives, actual and predicted per label) of balanced_accuracy and f1_macro.
+
+    python benchmarks/bench_metrics.py [--rows 1000000]
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+from sklearn import metrics
+
+sys.path.append(os.path.join(os.path.dirname(__file__), ".."))
+from evaluation_functions import compute_metrics
+
+SKLEARN_METRICS = {
+    "accuracy": metrics.accuracy_score,
+    "balanced_accuracy": metrics.balanced_accuracy_score,
+    "f1_macro": lambda y_true, y_pred: metrics.f1_score(
+        y_true, y_pred, average="macro"
+    ),
+}
+
+
+def timed(function):
+    start = time.perf_counter()
+    function()
+    return time.perf_counter() - start
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=1000000)
+    args = parser.parse_args()
+
+    rng = np.random.RandomState(0)
+    y_true = rng.randint(0, 5, args.rows)
+    y_pred = np.where(rng.rand(args.rows) < 0.7, y_true, rng.randint(0, 5, args.rows))
+
+    for n in range(1, len(SKLEARN_METRICS) + 1):
+        names = list(SKLEARN_METRICS)[:n]
+        sklearn_time = timed(
+            lambda: [SKLEARN_METRICS[name](y_true, y_pred) for name in names]
+        )
+        registry_time = timed(lambda: compute_metrics(y_true, y_pred, names))
+        print(
+            f"{n} metrics: sklearn {sklearn_time:.3f} s, "
+            f"compute_metrics {registry_time:.3f} s"
+        )
+
+    single = timed(lambda: compute_metrics(y_true, y_pred, ["balanced_accuracy"]))
+    both = timed(
+        lambda: compute_metrics(y_true, y_pred, ["balanced_accuracy", "f1_macro"])
+    )
+    print(
+        f"class counts: balanced_accuracy in {single:.3f} s, "
+        f"balanced_accuracy and f1_macro in {both:.3f} s"
+    )
@@ -0,0 +1,139 @@
+"""
+Per-request query times on a competition database, without and with the indexes
+added by migration 2.
+
+    python benchmarks/bench_queries.py [--users 500] [--submissions 100]
+"""
+import argparse
+import datetime
+import os
+import sys
+import tempfile
+import timeit
+
+import numpy as np
+from flask import Flask
+from sqlalchemy import func, text
+
+sys.path.append(os.path.join(os.path.dirname(__file__), ".."))
+import competition_tools
+from models import db, Evaluation, Submission, SubmissionStatus
+
+INDEXES = {
+    "ix_submission_user_id_timestamp": "submission (user_id, timestamp)",
+    "ix_evaluation_private_check_submission_id": "evaluation (private_check, submission_id)",
+}
+
+
+def populate(n_users, n_submissions, stage_handler):
+    rng = np.random.RandomState(0)
+    submissions, evaluations = [], []
+    s_id = 0
+    # submissions of different users are interleaved in time, as in a real competition
+    for n in range(n_submissions):
+        for u in range(n_users):
+            s_id += 1
+            timestamp = stage_handler.open_time + datetime.timedelta(
+                seconds=n * n_users + u
+            )
+            submissions.append(
+                dict(
+                    id=s_id,
+                    user_id=f"user_{u}",
+                    timestamp=timestamp,
+                    filename=f"{s_id}.csv",
+                    status=SubmissionStatus.SCORED,
+                )
+            )
+            evaluations.append(
+                dict(
+                    submission_id=s_id,
+                    evaluation_public=float(rng.rand()),
+                    evaluation_private=float(rng.rand()),
+                    timestamp=timestamp,
+                    private_check=bool(n >= n_submissions - 2 and u % 2),
+                )
+            )
+    db.session.execute(Submission.__table__.insert(), submissions)
+    db.session.execute(Evaluation.__table__.insert(), evaluations)
+    db.session.commit()
+    competition_tools.rebuild_user_summaries(db, stage_handler.close_time)
+
+
+def per_request_queries(user_id, stage_handler):
+    return {
+        "upload rate limit": lambda: db.session.query(func.max(Submission.timestamp))
+        .filter(Submission.user_id == user_id)
+        .first(),
+        "submissions page": lambda: db.session.query(
+            Submission.id,
+            Submission.user_id,
+            Submission.timestamp,
+            Evaluation.evaluation_public,
+            Evaluation.private_check,
+        )
+        .join(Submission)
+        .filter_by(user_id=user_id)
+        .all(),
+        "update submissions": lambda: db.session.query(Evaluation)
+        .join(Submission)
+        .filter_by(user_id=user_id)
+        .all(),
+        "selected private score": lambda: competition_tools.update_selected_private(
+            db, user_id, stage_handler.close_time
+        ),
+        "private leaderboard": lambda: competition_tools.get_private_leaderboard(
+            db, stage_handler
+        ),
+    }
+
+
+def measure(queries, repeat):
+    timings = dict()
+    for name, query in queries.items():
+        timings[name] = min(timeit.repeat(query, number=1, repeat=repeat))
+        db.session.rollback()
+    return timings
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--users", type=int, default=500)
+    parser.add_argument("--submissions", type=int, default=100)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    stage_handler = competition_tools.StageHandler(
+        "2020/01/01 00:00:00", "2030/01/01 00:00:00", "2030/01/02 00:00:00"
+    )
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        app = Flask(__name__)
+        app.config["SQLALCHEMY_DATABASE_URI"] = "sqlite:///" + os.path.join(
+            tmp_dir, "bench.db"
+        )
+        app.config["SQLALCHEMY_TRACK_MODIFICATIONS"] = False
+        db.init_app(app)
+
+        with app.app_context():
+            db.create_all()
+            populate(args.users, args.submissions, stage_handler)
+            queries = per_request_queries(f"user_{args.users // 2}", stage_handler)
+
+            for name in INDEXES:
+                db.session.execute(text(f"DROP INDEX {name}"))
+            db.session.commit()
+            before = measure(queries, args.repeat)
+
+            for name, columns in INDEXES.items():
+                db.session.execute(text(f"CREATE INDEX {name} ON {columns}"))
+            db.session.execute(text("ANALYZE"))
+            db.session.commit()
+            after = measure(queries, args.repeat)
+
+    print(f"{args.users * args.submissions} submissions ({args.users} users)")
+    print(f"{'query':<25}{'no indexes':>14}{'indexes':>14}")
+    for name in queries:
+        print(
+            f"{name:<25}{before[name] * 1000:>11.2f} ms{after[name] * 1000:>11.2f} ms"
+        )
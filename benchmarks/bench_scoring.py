@@ -0,0 +1,120 @@
+"""
+Time and peak Python memory of scoring a parsed submission: aligning it with the
+solution and computing the public and private scores.
+
+    python benchmarks/bench_scoring.py [--rows 1000000 10000000]
+
+- dataframes: the original path, sorting a DataFrame and slicing both frames with
+  boolean masks
+- masks: arrays sorted by id and selected with boolean masks (copies)
+- layout: a single take into the solution layout, scored on slices (views)
+
+Times are reported with the evaluator and without it (alignment and selection only).
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import numpy as np
+import pandas as pd
+
+sys.path.append(os.path.join(os.path.dirname(__file__), ".."))
+import competition_tools
+from competition_tools import INDEX, PUBLIC, TARGET
+from evaluation_functions import evaluator
+
+
+def score_dataframes(df_pred, df_true, ids, y_pred, solution, evaluate):
+    df_pred = df_pred.sort_index()
+    public_mask = (df_true[PUBLIC] == 1) | (df_true[PUBLIC] == 2)
+    private_mask = (df_true[PUBLIC] == 0) | (df_true[PUBLIC] == 2)
+    return (
+        evaluate(
+            df_true[public_mask][TARGET].values, df_pred[public_mask][TARGET].values
+        ),
+        evaluate(
+            df_true[private_mask][TARGET].values, df_pred[private_mask][TARGET].values
+        ),
+    )
+
+
+def score_masks(df_pred, df_true, ids, y_pred, solution, evaluate):
+    y_true, public_mask, private_mask = solution  # cached with the solution
+    y_sorted = y_pred[np.argsort(ids)]
+    return (
+        evaluate(y_true[public_mask], y_sorted[public_mask]),
+        evaluate(y_true[private_mask], y_sorted[private_mask]),
+    )
+
+
+def score_layout(df_pred, df_true, ids, y_pred, solution, evaluate):
+    aligned = competition_tools.align_predictions(y_pred, np.argsort(ids), solution)
+    return (
+        evaluate(solution.target[solution.public], aligned[solution.public]),
+        evaluate(solution.target[solution.private], aligned[solution.private]),
+    )
+
+
+def measure(score, *args):
+    start = time.perf_counter()
+    scores = score(*args, evaluator)
+    total = time.perf_counter() - start
+
+    start = time.perf_counter()
+    score(*args, lambda y_true, y_pred: None)
+    alignment = time.perf_counter() - start
+
+    tracemalloc.start()
+    score(*args, evaluator)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return scores, total, alignment, peak / 1024 / 1024
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, nargs="+", default=[1000000, 10000000])
+    args = parser.parse_args()
+
+    rng = np.random.RandomState(0)
+    for n_rows in args.rows:
+        df_true = pd.DataFrame(
+            {
+                INDEX: np.arange(n_rows),
+                TARGET: rng.randint(0, 2, n_rows),
+                PUBLIC: rng.randint(0, 3, n_rows),
+            }
+        ).set_index(INDEX)
+        ids = rng.permutation(n_rows)
+        y_pred = rng.randint(0, 2, n_rows)
+        df_pred = pd.DataFrame({INDEX: ids, TARGET: y_pred}).set_index(INDEX)
+
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            solution_file = os.path.join(tmp_dir, "solution.csv")
+            df_true.to_csv(solution_file)
+            solution = competition_tools.SolutionStore(solution_file).get()
+        masks = (
+            df_true[TARGET].values,
+            df_true[PUBLIC].isin([1, 2]).values,
+            df_true[PUBLIC].isin([0, 2]).values,
+        )
+
+        print(f"{n_rows} rows:")
+        expected = None
+        for score, solution_data in [
+            (score_dataframes, None),
+            (score_masks, masks),
+            (score_layout, solution),
+        ]:
+            scores, total, alignment, peak = measure(
+                score, df_pred, df_true, ids, y_pred, solution_data
+            )
+            assert expected is None or np.allclose(scores, expected)
+            expected = scores
+            print(
+                f"    {score.__name__:<17} {total:.3f} s "
+                f"(without evaluator {alignment:.3f} s), peak memory {peak:.0f} MB"
+            )
@@ -0,0 +1,71 @@
+"""
+Time and peak Python memory of the index validation of a submission: the previous
+comparison of two Python sets against `validate_submission` on the sorted solution.
+
+    python benchmarks/bench_validation.py [--rows 1000000 10000000]
+"""
+
+import argparse
+import os
+import sys
+import time
+import tracemalloc
+
+import numpy as np
+
+sys.path.append(os.path.join(os.path.dirname(__file__), ".."))
+import competition_tools
+
+
+def set_validation(ids, solution):
+    return set(ids) == set(solution.index)
+
+
+def run(validate, ids, solution):
+    try:
+        validate(ids, solution)
+    except Exception:
+        pass
+
+
+def measure(validate, ids, solution):
+    start = time.perf_counter()
+    run(validate, ids, solution)
+    elapsed = time.perf_counter() - start
+
+    # memory is traced in a second run, tracing slows down the allocations
+    tracemalloc.start()
+    run(validate, ids, solution)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return elapsed, peak / 1024 / 1024
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, nargs="+", default=[1000000, 10000000])
+    args = parser.parse_args()
+
+    rng = np.random.RandomState(0)
+    for n_rows in args.rows:
+        index = np.arange(n_rows, dtype=np.int64)
+        solution = competition_tools.Solution(
+            index=index,
+            layout=None,
+            target=None,
+            public=None,
+            private=None,
+            bootstrap=None,
+        )
+        valid = rng.permutation(index)
+        invalid = valid.copy()
+        invalid[:10] = invalid[10:20]  # 10 duplicate and 10 missing ids
+
+        print(f"{n_rows} ids:")
+        for name, ids in [("valid", valid), ("invalid", invalid)]:
+            for validate in [set_validation, competition_tools.validate_submission]:
+                elapsed, peak = measure(validate, ids, solution)
+                print(
+                    f"    {name:<8} {validate.__name__:<20} {elapsed:.2f} s, "
+                    f"peak memory {peak:.0f} MB"
+                )
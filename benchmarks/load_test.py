@@ -0,0 +1,154 @@
+"""
+Load test for a running competition server: parallel uploads and leaderboard reads.
+
+Uploads are made with the given API key (use the baseline one, which is not subject
+to the submission limits) and the given solution file. Every upload rejected with an
+error page is reported with its message, so that "database is locked" errors show up.
+
+    python benchmarks/load_test.py --url http://localhost:8888 --api-key BASELINE_KEY \
+        --submission etc/submission_test_1.csv --writers 8 --readers 32 --duration 30
+
+The default read path is served from the leaderboard cache; use --read-path to read a
+page that queries the database on every request.
+"""
+import argparse
+import collections
+import http.cookiejar
+import re
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+import uuid
+
+import numpy as np
+
+
+class NoRedirect(urllib.request.HTTPRedirectHandler):
+    def redirect_request(self, req, fp, code, msg, headers, newurl):
+        return None
+
+
+class Stats:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.latencies = collections.defaultdict(list)
+        self.outcomes = collections.defaultdict(collections.Counter)
+
+    def add(self, kind, latency, outcome):
+        with self._lock:
+            self.latencies[kind].append(latency)
+            self.outcomes[kind][outcome] += 1
+
+
+def open_url(opener, request):
+    try:
+        response = opener.open(request, timeout=60)
+        return response.status, response.headers, response.read()
+    except urllib.error.HTTPError as ex:
+        return ex.code, ex.headers, ex.read()
+
+
+def upload(opener, url, api_key, content):
+    status, headers, body = open_url(opener, url + "/submit")
+    submit_request_id = re.search(
+        rb'name="submitRequestId" value="([^"]+)"', body
+    ).group(1)
+
+    boundary = uuid.uuid4().hex
+    fields = [
+        (b'name="api_key"', api_key.encode()),
+        (b'name="submitRequestId"', submit_request_id),
+        (
+            b'name="submittedSolutionFile"; filename="submission.csv"\r\n'
+            b"Content-Type: text/csv",
+            content,
+        ),
+    ]
+    body = b"".join(
+        b"--%s\r\nContent-Disposition: form-data; %s\r\n\r\n%s\r\n"
+        % (boundary.encode(), header, value)
+        for header, value in fields
+    ) + (b"--%s--\r\n" % boundary.encode())
+    request = urllib.request.Request(
+        url + "/upload",
+        data=body,
+        headers={"Content-Type": f"multipart/form-data; boundary={boundary}"},
+    )
+    status, headers, _ = open_url(opener, request)
+
+    location = headers.get("Location", "")
+    if "error_message=" in location:
+        message = urllib.parse.parse_qs(urllib.parse.urlparse(location).query)
+        return "rejected: " + message["error_message"][0][:60]
+    return f"HTTP {status}"
+
+
+def writer(args, content, stats, deadline):
+    opener = urllib.request.build_opener(
+        NoRedirect, urllib.request.HTTPCookieProcessor(http.cookiejar.CookieJar())
+    )
+    while time.time() < deadline:
+        start = time.perf_counter()
+        try:
+            outcome = upload(opener, args.url, args.api_key, content)
+        except Exception as ex:
+            outcome = f"failed: {type(ex).__name__}"
+        stats.add("upload", time.perf_counter() - start, outcome)
+
+
+def reader(args, stats, deadline):
+    opener = urllib.request.build_opener(NoRedirect)
+    while time.time() < deadline:
+        start = time.perf_counter()
+        try:
+            status, _, _ = open_url(opener, args.url + args.read_path)
+            outcome = f"HTTP {status}"
+        except Exception as ex:
+            outcome = f"failed: {type(ex).__name__}"
+        stats.add("leaderboard", time.perf_counter() - start, outcome)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--url", type=str, default="http://localhost:8888")
+    parser.add_argument("--api-key", type=str, required=True)
+    parser.add_argument("--submission", type=str, required=True)
+    parser.add_argument("--writers", type=int, default=8)
+    parser.add_argument("--readers", type=int, default=32)
+    parser.add_argument("--duration", type=float, default=30, help="seconds")
+    parser.add_argument(
+        "--read-path",
+        type=str,
+        default="/?highlight=load_test",
+        help="The page read by the readers, e.g. /fleaderboard?api_key=ADMIN_KEY",
+    )
+    args = parser.parse_args()
+
+    with open(args.submission, "rb") as f:
+        content = f.read()
+
+    stats = Stats()
+    deadline = time.time() + args.duration
+    threads = [
+        threading.Thread(target=writer, args=(args, content, stats, deadline))
+        for _ in range(args.writers)
+    ] + [
+        threading.Thread(target=reader, args=(args, stats, deadline))
+        for _ in range(args.readers)
+    ]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    for kind, latencies in stats.latencies.items():
+        latencies = np.array(latencies) * 1000
+        print(
+            f"{kind}: {len(latencies)} requests ({len(latencies) / args.duration:.1f}/s) - "
+            f"latency p50 {np.percentile(latencies, 50):.1f} ms, "
+            f"p95 {np.percentile(latencies, 95):.1f} ms, max {latencies.max():.1f} ms"
+        )
+        for outcome, count in stats.outcomes[kind].most_common():
+            print(f"    {count:>6}  {outcome}")
@@ -1,16 +1,32 @@
+import csv
 import datetime
 import sys
+import tempfile
 import threading
 
 import pandas as pd
 import os
+from collections import namedtuple
 from enum import Enum
-from evaluation_functions import evaluator
-from sqlalchemy import inspect, func
+from evaluation_functions import (
+    bootstrap_interval,
+    compute_metrics,
+    metric_names,
+    primary_metric,
+)
+from sqlalchemy import func, case
 from config import CompetitionConfig
 import numpy as np
 
-from models import Submission, Evaluation
+import db_dump
+import leaderboard_history
+from models import (
+    Submission,
+    Evaluation,
+    EvaluationBootstrap,
+    EvaluationMetric,
+    UserSummary,
+)
 
 ALLOWED_EXTENSIONS = {".csv"}
 
@@ -53,18 +69,12 @@ def get_user_scores(db, user_id, maximized_score=True):
 
 def get_public_leaderboard(db, maximized_score=True):
     participants = (
-        db.session.query(
-            Submission.user_id,
-            func.max(Evaluation.evaluation_public)
-            if maximized_score
-            else func.min(Evaluation.evaluation_public),
-        )
-        .join(Submission)
-        .group_by(Submission.user_id)
+        db.session.query(UserSummary.user_id, UserSummary.best_public)
         .order_by(
-            Evaluation.evaluation_public.desc()
+            UserSummary.best_public.desc()
             if maximized_score
-            else Evaluation.evaluation_public
+            else UserSummary.best_public,
+            UserSummary.user_id,
         )
         .all()
     )
@@ -73,65 +83,109 @@ def get_public_leaderboard(db, maximized_score=True):
     return participants
 
 
-def get_private_leaderboard(db, stage_handler, maximized_score=True):
-    participants = list()
+def get_public_intervals(db, participants, maximized_score=True):
+    """
+    Bootstrap confidence intervals of the best public scores of the `participants`.
 
-    # Get the max private score corresponding to the people that have selected at least one solution
-    participants_select = (
-        db.session.query(
-            Submission.user_id,
-            func.max(Evaluation.evaluation_private)
-            if maximized_score
-            else func.min(Evaluation.evaluation_private),
+    Returns {user_id: (low, high, beats_next)}, where `beats_next` is the share of the
+    shared resamples in which the user scores better than the next one on the public
+    leaderboard (None for the last user or if the next one has no interval).
+    """
+    bootstraps = {
+        user_id: (
+            score_mapper(low),
+            score_mapper(high),
+            np.frombuffer(replicates, dtype=np.float32),
         )
-        .join(Submission)
-        .filter(
-            Submission.timestamp < stage_handler.close_time,
-            Evaluation.private_check.is_(True),
-        )
-        .group_by(Submission.user_id)
-        .order_by(
-            Evaluation.evaluation_private.desc()
-            if maximized_score
-            else Evaluation.evaluation_private
+        for user_id, low, high, replicates in db.session.query(
+            UserSummary.user_id,
+            EvaluationBootstrap.ci_low,
+            EvaluationBootstrap.ci_high,
+            EvaluationBootstrap.replicates,
+        ).join(
+            EvaluationBootstrap,
+            EvaluationBootstrap.submission_id == UserSummary.best_submission_id,
         )
-        .all()
-    )
+    }
+
+    intervals = dict()
+    next_users = [user_id for user_id, _ in participants[1:]] + [None]
+    for (user_id, _), next_user_id in zip(participants, next_users):
+        if user_id not in bootstraps:
+            continue
+        low, high, replicates = bootstraps[user_id]
+        beats_next = None
+        if next_user_id in bootstraps:
+            next_replicates = bootstraps[next_user_id][2]
+            if len(next_replicates) == len(replicates):
+                difference = replicates - next_replicates
+                if not maximized_score:
+                    difference = -difference
+                beats_next = np.mean(difference > 0) + np.mean(difference == 0) / 2
+        intervals[user_id] = (low, high, beats_next)
+    return intervals
+
+
+def get_private_leaderboard(db, stage_handler, maximized_score=True):
+    """
+    Computes the final ranking with a single query on the submissions made before the close.
+
+    Users that selected at least one submission get the best private score among the
+    selected ones, the others the private score of their best public submission (the
+    latest one in case of ties). Ties in the ranking are broken placing first the users
+    with a selection, sorted by user_id in the direction of the score, then the others
+    sorted by user_id desc.
+    """
+
+    def best_first(column):
+        return column.desc() if maximized_score else column.asc()
 
-    participants += participants_select
+    selected_private = case(
+        (Evaluation.private_check.is_(True), Evaluation.evaluation_private)
+    )
 
-    # Get the people that did not select any solutions sorted by user_id, evaluation_public and timestamp
-    participants_not_select = (
+    # Number each user's evaluations, starting from the one defining the private score
+    ranked_evaluations = (
         db.session.query(
-            Submission.user_id,
-            Evaluation.evaluation_public,
-            Evaluation.evaluation_private,
+            Submission.user_id.label("user_id"),
+            Evaluation.evaluation_private.label("score"),
+            Evaluation.private_check.label("selected"),
+            func.row_number()
+            .over(
+                partition_by=Submission.user_id,
+                order_by=(
+                    Evaluation.private_check.desc(),
+                    best_first(selected_private),
+                    best_first(Evaluation.evaluation_public),
+                    Submission.timestamp.desc(),
+                ),
+            )
+            .label("position"),
         )
         .join(Submission)
-        .filter(
-            Submission.timestamp < stage_handler.close_time,
-            Submission.user_id.notin_([u_id for u_id, _ in participants_select]),
-        )
+        .filter(Submission.timestamp < stage_handler.close_time)
+        .subquery()
+    )
+
+    participants = (
+        db.session.query(ranked_evaluations.c.user_id, ranked_evaluations.c.score)
+        .filter(ranked_evaluations.c.position == 1)
         .order_by(
-            Submission.user_id.desc(),
-            Evaluation.evaluation_public.desc()
-            if maximized_score
-            else Evaluation.evaluation_public,
-            Submission.timestamp.desc(),
+            best_first(ranked_evaluations.c.score),
+            ranked_evaluations.c.selected.desc(),
+            best_first(
+                case(
+                    (
+                        ranked_evaluations.c.selected.is_(True),
+                        ranked_evaluations.c.user_id,
+                    )
+                )
+            ),
+            ranked_evaluations.c.user_id.desc(),
         )
         .all()
     )
 
-    # Get the private score corresponding to the max public score for the people that did not select any solutions
-    # Since data is sorted desc, the first entry for each user is the score to take
-    u_placeholder = set()
-    for pns in participants_not_select:
-        if pns[0] not in u_placeholder:
-            participants.append((pns[0], pns[2]))
-        u_placeholder.add(pns[0])
-
-    # Sort the scores
-    participants = sorted(participants, key=lambda x: x[1], reverse=maximized_score)
     participants = [(user_id, score_mapper(score)) for user_id, score in participants]
 
     return participants
@@ -139,9 +193,8 @@ def get_private_leaderboard(db, stage_handler, maximized_score=True):
 
 def get_peruser_submissions_number(db):
     peruser_submission_count = (
-        db.session.query(Submission.user_id, func.count(Submission.user_id))
-        .filter(Submission.user_id != CompetitionConfig.ADMIN_USER_ID)
-        .group_by(Submission.user_id)
+        db.session.query(UserSummary.user_id, UserSummary.submission_count)
+        .filter(UserSummary.user_id != CompetitionConfig.ADMIN_USER_ID)
         .all()
     )  # this result contains the baseline scores
     return peruser_submission_count
@@ -149,12 +202,185 @@ def get_peruser_submissions_number(db):
 
 def get_user_submissions_number(user_id, db):
     submission_count = (
-        db.session.query(func.count(Evaluation.submission_id))
+        db.session.query(UserSummary.submission_count)
+        .filter(UserSummary.user_id == user_id)
+        .scalar()
+    )
+    return submission_count or 0
+
+
+def evaluation_metric_rows(submission_id, metrics):
+    """EvaluationMetric rows of {name: (public, private)}, undefined scores as NULL."""
+    return [
+        dict(
+            submission_id=submission_id,
+            metric=name,
+            public=float(public) if np.isfinite(public) else None,
+            private=float(private) if np.isfinite(private) else None,
+        )
+        for name, (public, private) in metrics.items()
+    ]
+
+
+def evaluation_bootstrap_row(submission_id, bootstrap):
+    """EvaluationBootstrap row of a (low, high, replicates) confidence interval."""
+    low, high, replicates = bootstrap
+    return dict(
+        submission_id=submission_id,
+        ci_low=float(low),
+        ci_high=float(high),
+        replicates=replicates.astype(np.float32).tobytes(),
+    )
+
+
+def record_evaluation(
+    db,
+    submission,
+    public_score,
+    private_score,
+    maximized_score=True,
+    metrics=None,
+    bootstrap=None,
+):
+    """
+    Adds the Evaluation of `submission` and updates the summary of its user.
+
+    `metrics` ({name: (public_score, private_score)}) and the `bootstrap` confidence
+    interval of the public score (low, high, replicates) are stored with the evaluation.
+
+    The changes, and the delta of the leaderboard history, are left in the current
+    transaction: the caller commits them.
+    The summary is updated with a single UPDATE statement, so that concurrent
+    evaluations of the same user do not overwrite each other.
+    """
+    # numpy scores cannot be bound by every database driver
+    public_score, private_score = float(public_score), float(private_score)
+    evaluation = Evaluation(
+        submission=submission,
+        evaluation_public=public_score,
+        evaluation_private=private_score,
+    )
+    db.session.add(evaluation)
+    for row in evaluation_metric_rows(submission.id, metrics or dict()):
+        db.session.add(EvaluationMetric(evaluation=evaluation, **row))
+    if bootstrap is not None:
+        row = evaluation_bootstrap_row(submission.id, bootstrap)
+        db.session.add(EvaluationBootstrap(evaluation=evaluation, **row))
+    leaderboard_history.record_delta(db, submission, public_score, maximized_score)
+
+    improved = (
+        UserSummary.best_public < public_score
+        if maximized_score
+        else UserSummary.best_public > public_score
+    )
+    updated = (
+        db.session.query(UserSummary)
+        .filter(UserSummary.user_id == submission.user_id)
+        .update(
+            {
+                UserSummary.submission_count: UserSummary.submission_count + 1,
+                UserSummary.last_submission: case(
+                    (
+                        UserSummary.last_submission < submission.timestamp,
+                        submission.timestamp,
+                    ),
+                    else_=UserSummary.last_submission,
+                ),
+                UserSummary.best_public: case(
+                    (improved, public_score), else_=UserSummary.best_public
+                ),
+                UserSummary.best_submission_id: case(
+                    (improved, submission.id), else_=UserSummary.best_submission_id
+                ),
+            },
+            synchronize_session=False,
+        )
+    )
+    if not updated:
+        db.session.add(
+            UserSummary(
+                user_id=submission.user_id,
+                best_public=public_score,
+                best_submission_id=submission.id,
+                submission_count=1,
+                last_submission=submission.timestamp,
+            )
+        )
+
+    return evaluation
+
+
+def update_selected_private(db, user_id, close_time, maximized_score=True):
+    """
+    Refreshes the best selected private score of `user_id` after a selection change.
+
+    Returns the new score, None if no submission is selected.
+    """
+    best = func.max if maximized_score else func.min
+    best_private_selected = (
+        db.session.query(best(Evaluation.evaluation_private))
         .join(Submission)
-        .filter(Submission.user_id.is_(user_id))
+        .filter(
+            Submission.user_id == user_id,
+            Submission.timestamp < close_time,
+            Evaluation.private_check.is_(True),
+        )
         .scalar()
     )
-    return submission_count
+    db.session.query(UserSummary).filter(UserSummary.user_id == user_id).update(
+        {UserSummary.best_private_selected: best_private_selected},
+        synchronize_session=False,
+    )
+    return best_private_selected
+
+
+def _is_better(score, best, maximized_score):
+    return score > best if maximized_score else score < best
+
+
+def rebuild_user_summaries(db, close_time, maximized_score=True):
+    """Recomputes every UserSummary from the evaluations (e.g. at startup)."""
+    evaluations = (
+        db.session.query(
+            Submission.user_id,
+            Submission.id,
+            Submission.timestamp,
+            Evaluation.evaluation_public,
+            Evaluation.evaluation_private,
+            Evaluation.private_check,
+        )
+        .join(Submission)
+        .order_by(Submission.timestamp, Submission.id)
+        .all()
+    )
+
+    summaries = dict()
+    for user_id, s_id, timestamp, public, private, private_check in evaluations:
+        summary = summaries.get(user_id)
+        if summary is None:
+            summary = summaries[user_id] = UserSummary(
+                user_id=user_id,
+                best_public=public,
+                best_submission_id=s_id,
+                submission_count=0,
+                last_submission=timestamp,
+            )
+        elif _is_better(public, summary.best_public, maximized_score):
+            summary.best_public = public
+            summary.best_submission_id = s_id
+
+        summary.submission_count += 1
+        summary.last_submission = timestamp
+
+        if private_check and timestamp < close_time:
+            if summary.best_private_selected is None or _is_better(
+                private, summary.best_private_selected, maximized_score
+            ):
+                summary.best_private_selected = private
+
+    db.session.query(UserSummary).delete(synchronize_session=False)
+    db.session.add_all(summaries.values())
+    db.session.commit()
 
 
 def get_submissions_number(db):
@@ -191,16 +417,7 @@ def check_solution_file(solution_file):
     return True
 
 
-def check_file(file, test_file):
-    try:
-        test_df = pd.read_csv(test_file, index_col=INDEX)
-    except Exception as ex:
-        raise Exception(f"Test solution error - File: {test_file} - {ex}")
-
-    submitted_df = pd.read_csv(file.stream, index_col=INDEX)
-    submitted_columns = list(submitted_df.columns) + [
-        INDEX
-    ]  # "INDEX" is not included in .columns
+def check_header(submitted_columns):
     # check file schema
     if not (all([h in submitted_columns for h in HEADER]) == True):
         missing_cols = [h for h in HEADER if h not in submitted_columns]
@@ -213,45 +430,418 @@ def check_file(file, test_file):
             f"Too many columns - Expecting columns {HEADER} in submitted solution."
         )
 
+    return True
+
+
+def parse_header(line):
+    """Column names of the (bytes) header line of a submission."""
+    return next(csv.reader([line.decode("utf-8-sig")]), [])
+
+
+class SubmissionSpool(tempfile.SpooledTemporaryFile):
+    """
+    File receiving an uploaded submission, checked while the request body is read.
+
+    The header is checked as soon as its line is complete and the rows are counted
+    on the fly, so that uploads with a wrong header or more rows than the solution
+    are rejected without being received whole. Content past `max_size` bytes is
+    spooled to disk.
+    """
+
+    MAX_HEADER_SIZE = 64 * 1024
+
+    def __init__(self, solution, max_size=500 * 1024):
+        super().__init__(max_size=max_size, mode="w+b")
+        self.max_rows = len(solution.index)
+        self.rows = -1  # the header line is not a row
+        self._header = b""
+        self._after_newline = True  # blank lines are not rows
+
+    def _check_header(self, data):
+        self._header += data
+        end = self._header.find(b"\n")
+        if end >= 0:
+            check_header(parse_header(self._header[:end]))
+            self._header = None
+        elif len(self._header) > self.MAX_HEADER_SIZE:
+            raise Exception(
+                f"Missing header - Expecting columns {HEADER} in submitted solution."
+            )
+
+    def _count_rows(self, data):
+        chars = np.frombuffer(data, dtype=np.uint8)
+        newlines = chars[chars != ord("\r")] == ord("\n")
+        if len(newlines) == 0:
+            return
+        # a row ends with the first newline after some content
+        after_newline = np.concatenate([[self._after_newline], newlines[:-1]])
+        self.rows += np.count_nonzero(newlines & ~after_newline)
+        self._after_newline = newlines[-1]
+
+        if self.rows > self.max_rows:
+            raise Exception(
+                f"Submitted solution length does not match the dataset length. Submitted solution has more than {self.max_rows} rows."
+            )
+
+    def write(self, data):
+        if self._header is not None:
+            self._check_header(bytes(data))
+        self._count_rows(data)
+        return super().write(data)
+
+
+def read_submission(source, solution):
+    """
+    Parses a submission file (path or binary stream) into the arrays (ids, predictions).
+
+    The header is checked before the body is read. The body is parsed by the
+    `SUBMISSION_CSV_ENGINE` of pandas, the ids with the dtype of the solution and the
+    predictions as floats (numeric target) or objects (string labels), and both
+    columns are returned as contiguous arrays in file order.
+    """
+    if isinstance(source, (str, os.PathLike)):
+        with open(source, "rb") as f:
+            return read_submission(f, solution)
+
+    submitted_columns = parse_header(source.readline())
+    check_header(submitted_columns)
+    # e.g. 0.7 is a valid prediction of an integer target
+    predicted_dtype = np.float64 if solution.target.dtype.kind in "biuf" else object
+
+    try:
+        submitted_df = pd.read_csv(
+            source,
+            header=None,
+            names=submitted_columns,
+            dtype={INDEX: solution.index.dtype, TARGET: predicted_dtype},
+            engine=CompetitionConfig.SUBMISSION_CSV_ENGINE,
+        )
+    except (ValueError, pd.errors.ParserError) as ex:
+        raise Exception(f"Submitted solution cannot be parsed: {ex}")
+
+    return (
+        np.ascontiguousarray(submitted_df[INDEX].values),
+        np.ascontiguousarray(submitted_df[TARGET].values),
+    )
+
+
+def first_values(values, n=5):
+    values = list(values[:n]) + (["..."] if len(values) > n else [])
+    return "[" + ", ".join(str(v) for v in values) + "]"
+
+
+def index_errors(sorted_ids, solution):
+    """Describes the duplicate, missing and unexpected ids of the sorted submitted ids."""
+    duplicated = np.unique(sorted_ids[1:][sorted_ids[1:] == sorted_ids[:-1]])
+
+    # match every submitted id with its position in the (sorted) solution index
+    positions = np.searchsorted(solution.index, sorted_ids)
+    positions[positions == len(solution.index)] = 0
+    found = solution.index[positions] == sorted_ids
+    unexpected = np.unique(sorted_ids[~found])
+    submitted = np.zeros(len(solution.index), dtype=bool)
+    submitted[positions[found]] = True
+    missing = solution.index[~submitted]
+
+    errors = [
+        f"{len(ids)} {kind} ids {first_values(ids)}"
+        for kind, ids in [
+            ("duplicate", duplicated),
+            ("missing", missing),
+            ("unexpected", unexpected),
+        ]
+        if len(ids)
+    ]
+    return ", ".join(errors)
+
+
+def validate_submission(ids, solution):
+    """
+    Checks the submitted ids against the solution index.
+
+    Returns the permutation sorting the ids, which aligns the predictions with the
+    solution. The ids are compared to the sorted solution index after one sort:
+    duplicate, missing and unexpected ids are only looked for when they differ.
+    """
+    order = np.argsort(ids)
+    sorted_ids = ids[order]
+
     # check file len
-    if len(submitted_df.index) != len(test_df.index):
+    if len(ids) != len(solution.index):
         raise Exception(
-            f"Submitted solution length does not match the dataset length. Submitted solution has {len(submitted_df.index)} rows while Dataset has {len(test_df.index)} rows."
+            f"Submitted solution length does not match the dataset length. Submitted solution has {len(ids)} rows while Dataset has {len(solution.index)} rows: {index_errors(sorted_ids, solution)}."
         )
 
-    # TODO: check file size
+    # the file size is limited by MAX_CONTENT_LENGTH while the upload is received
 
     # check indices
-    if set(submitted_df.index) != set(test_df.index):
-        raise Exception("Indices do not match!")
+    if not np.array_equal(sorted_ids, solution.index):
+        raise Exception(f"Indices do not match! {index_errors(sorted_ids, solution)}.")
 
-    return True
+    return order
+
+
+def align_predictions(y_pred, order, solution):
+    """Rearranges validated predictions in the layout of the solution with a single take."""
+    return y_pred.take(order.take(solution.layout))
+
+
+def score_metrics(y_pred, solution, names=metric_names):
+    """
+    Scores predictions aligned with the solution layout on the metrics `names`.
 
+    Returns {name: (public_score, private_score)}. The metrics of each leaderboard are
+    computed together on views of the target and the predictions.
+    """
+    public_scores = compute_metrics(
+        solution.target[solution.public], y_pred[solution.public], names
+    )
+    private_scores = compute_metrics(
+        solution.target[solution.private], y_pred[solution.private], names
+    )
+
+    return {name: (public_scores[name], private_scores[name]) for name in names}
+
+
+def bootstrap_public(y_pred, solution):
+    """Bootstrap confidence interval of the public primary score, None if disabled."""
+    if solution.bootstrap is None:
+        return None
+    return bootstrap_interval(
+        solution.target[solution.public],
+        y_pred[solution.public],
+        solution.bootstrap,
+        primary_metric,
+    )
+
+
+# `metrics` maps every metric to its (public, private) scores, `bootstrap` is the
+# confidence interval of the public primary score (or None)
+Scores = namedtuple("Scores", ["metrics", "bootstrap"])
+
+
+def evaluate_predictions(y_pred, solution):
+    """Scores predictions aligned with the solution layout, for `record_evaluation`."""
+    return Scores(score_metrics(y_pred, solution), bootstrap_public(y_pred, solution))
+
+
+def score_predictions(y_pred, solution):
+    """Scores predictions aligned with the solution layout on the primary metric."""
+    return score_metrics(y_pred, solution, [primary_metric])[primary_metric]
+
+
+def predictions_file(filename):
+    """The binary copy of the submission stored in `filename`."""
+    return os.path.splitext(filename)[0] + ".npy"
+
+
+def compact(values):
+    """`values` with the smallest dtype holding them, strings without objects."""
+    if values.dtype == object:
+        return values.astype(str)
+    if (
+        values.dtype.kind == "f"
+        and len(values)
+        and np.abs(values).max() < 2**53
+        and np.array_equal(np.trunc(values), values)
+    ):
+        # labels parsed as floats, e.g. the predictions of an integer target
+        values = values.astype(np.int64)
+    if values.dtype.kind in "iu" and len(values):
+        return values.astype(
+            np.result_type(
+                np.min_scalar_type(values.min()), np.min_scalar_type(values.max())
+            )
+        )
+    return values
+
+
+def save_predictions(filename, ids, y_pred):
+    """
+    Stores a submission sorted by id as a structured (Id, Predicted) array next to it.
+
+    The .npy file can be memory-mapped by `load_predictions` without any parsing.
+    """
+    ids, y_pred = compact(ids), compact(y_pred)
+    predictions = np.empty(len(ids), dtype=[(INDEX, ids.dtype), (TARGET, y_pred.dtype)])
+    predictions[INDEX] = ids
+    predictions[TARGET] = y_pred
+
+    path = predictions_file(filename)
+    with open(path + ".tmp", "wb") as f:
+        np.save(f, predictions)
+    os.replace(path + ".tmp", path)
+
+
+def load_predictions(filename, solution):
+    """
+    Memory-maps the binary copy of a submission and aligns it with the solution layout.
+
+    Returns None if there is no binary copy or if it does not match the solution ids
+    (e.g. it was stored for a previous solution file).
+    """
+    path = predictions_file(filename)
+    if not os.path.exists(path):
+        return None
+
+    predictions = np.load(path, mmap_mode="r")
+    if not np.array_equal(predictions[INDEX], solution.index):
+        return None
+    return predictions[TARGET].take(solution.layout)
+
+
+def read_predictions(submission, solution):
+    y_pred = load_predictions(submission, solution)
+    if y_pred is not None:
+        return y_pred
 
-def eval_public_private(submission, solution):
     try:
-        df_pred = pd.read_csv(submission, index_col=INDEX).sort_index()
-        df_true = pd.read_csv(solution, index_col=INDEX).sort_index()
-        assert len(df_pred) == len(df_true)  # already checked, should be true!x
-        assert (
-            df_pred.index == df_true.index
-        ).all()  # already checked, should be true!
+        ids, y_pred = read_submission(submission, solution)
+        order = validate_submission(ids, solution)  # already checked, should be true!
     except Exception:
         # We should never fail here -- the file has already been validated!
         raise Exception("Unexpected error! Please contact an administrator")
 
-    public_mask = (df_true[PUBLIC] == 1) | (df_true[PUBLIC] == 2)
-    y_pred_public = df_pred[public_mask][TARGET].values
-    y_true_public = df_true[public_mask][TARGET].values
+    return align_predictions(y_pred, order, solution)
+
+
+def accept_submission(file, solution, output_file):
+    """
+    Validates and stores an uploaded submission reading its stream only once.
+
+    The accepted submission is stored sorted by id in a binary copy next to
+    `output_file`, and the raw upload in `output_file` unless KEEP_SUBMISSION_CSV
+    is disabled. Returns the predictions aligned with the solution layout, ready
+    to be scored.
+    """
+    ids, y_pred = read_submission(file.stream, solution)
+    order = validate_submission(ids, solution)
+
+    y_sorted = y_pred.take(order)
+    save_predictions(output_file, solution.index, y_sorted)
+    if CompetitionConfig.KEEP_SUBMISSION_CSV:
+        # the stream has been consumed by the parser, rewind it to store the raw bytes
+        file.stream.seek(0)
+        file.save(output_file)
+
+    return y_sorted.take(solution.layout)
+
+
+def discard_submission(output_file):
+    """Removes the files stored by `accept_submission`, for a submission not queued."""
+    for filename in [output_file, predictions_file(output_file)]:
+        try:
+            os.remove(filename)
+        except FileNotFoundError:
+            pass  # the raw upload is only kept with KEEP_SUBMISSION_CSV
+
 
-    private_mask = (df_true[PUBLIC] == 0) | (df_true[PUBLIC] == 2)
-    y_pred_private = df_pred[private_mask][TARGET].values
-    y_true_private = df_true[private_mask][TARGET].values
+def queue_submission(db, evaluation_queue, submission, y_pred):
+    """
+    Queues a stored submission for evaluation, returns its id.
 
-    public_score = evaluator(y_true_public, y_pred_public)
-    private_score = evaluator(y_true_private, y_pred_private)
+    If the queue refuses it the submission is rolled back: its row is deleted and its
+    files are discarded, so that it does not count for the user.
+    """
+    # read before scoring: a synchronous evaluation ends the session
+    submission_id, output_file = submission.id, submission.filename
+    try:
+        evaluation_queue.submit(submission_id, y_pred)
+    except Exception:
+        db.session.delete(submission)
+        db.session.commit()
+        discard_submission(output_file)
+        raise
+    return submission_id
+
+
+def process_submission(file, solution_store, output_file):
+    solution = solution_store.get()
+    y_pred = accept_submission(file, solution, output_file)
+    return score_predictions(y_pred, solution)
+
+
+# `index` holds the sorted ids. Rows are stored in the layout: public only, public and
+# private, private only - `layout` maps each layout row to its position in `index`, and
+# `public` and `private` are the slices of the layout scored by each leaderboard.
+# `bootstrap` holds the indices of the public resamples (one per row), or None.
+Solution = namedtuple(
+    "Solution", ["index", "layout", "target", "public", "private", "bootstrap"]
+)
+
+# position of each value of the PUBLIC column in the layout
+LAYOUT_GROUPS = {1: 0, 2: 1, 0: 2}
+
+
+class SolutionStore:
+    """
+    Keeps the parsed solution file in memory, sorted by index.
+
+    The file is parsed once and re-parsed only when its modification time changes,
+    so that a solution fixed during the competition is picked up without a restart.
+    `get` returns an immutable snapshot: callers should fetch it once and use it for
+    the whole check/evaluation.
+    """
+
+    def __init__(self, solution_file):
+        self.solution_file = solution_file
+        self._lock = threading.Lock()
+        self._mtime = None
+        self._solution = None
+        self.get()
+
+    def _load(self):
+        solution_df = pd.read_csv(self.solution_file, index_col=INDEX).sort_index()
+        groups = solution_df[PUBLIC].map(LAYOUT_GROUPS).values
+        layout = np.argsort(groups, kind="stable")
+        public_only, both = np.bincount(groups, minlength=3)[:2]
+
+        return Solution(
+            index=solution_df.index.values,
+            layout=layout,
+            target=np.ascontiguousarray(solution_df[TARGET].values[layout]),
+            public=slice(0, public_only + both),
+            private=slice(public_only, len(layout)),
+            bootstrap=self._bootstrap_bank(public_only + both),
+        )
+
+    @staticmethod
+    def _bootstrap_bank(n_public):
+        """
+        Indices of the public resamples, drawn with replacement.
+
+        The seed is fixed so that every process draws the same bank: the replicates of
+        all the submissions are paired and can be compared with each other.
+        """
+        resamples = CompetitionConfig.BOOTSTRAP_RESAMPLES
+        if resamples == 0 or n_public == 0:
+            return None
+        rng = np.random.RandomState(CompetitionConfig.BOOTSTRAP_SEED)
+        return rng.randint(
+            0,
+            n_public,
+            size=(resamples, min(n_public, CompetitionConfig.BOOTSTRAP_SAMPLE_SIZE)),
+            dtype=np.int32,
+        )
 
-    return public_score, private_score
+    def get(self):
+        try:
+            mtime = os.path.getmtime(self.solution_file)
+        except OSError as ex:
+            if self._solution is None:
+                raise Exception(
+                    f"Test solution error - File: {self.solution_file} - {ex}"
+                )
+            # keep serving the last valid solution if the file is being replaced
+            return self._solution
+
+        if mtime != self._mtime:
+            with self._lock:
+                if mtime != self._mtime:
+                    print(f"Loading solution file '{self.solution_file}'...")
+                    self._solution = self._load()
+                    self._mtime = mtime
+        return self._solution
 
 
 def allowed_file(filename):
@@ -270,7 +860,9 @@ def get_timestamp():
     return timestamp_id
 
 
-def schedule_db_dump(sched_time, db, stage_name, dump_out):
+def schedule_db_dump(
+    sched_time, db, stage_name, dump_out, dump_format="csv", chunk_size=10000
+):
 
     if not os.path.isdir(dump_out):
         print(f"Dump folder '{dump_out}' not exist! Create it!")
@@ -282,19 +874,13 @@ def schedule_db_dump(sched_time, db, stage_name, dump_out):
     delay = (parsed_sched_time - now).total_seconds()
 
     def dumb_db_dump(db, stage_name, dump_out):
-        dump_time = datetime.datetime.utcnow().strftime("%Y%m%d%H%M%S")
-        inspector = inspect(db.engine)
-
-        for t_name in inspector.get_table_names():
-            dest_path = os.path.join(
-                dump_out, f"{t_name}_{stage_name}_{dump_time}_dump.csv"
-            )
-
-            print(f"Loading table '{t_name}'...")
-            t_df = pd.read_sql_table(t_name, con=db.engine)
-
-            print(f"Dumping {t_name} to {dest_path}")
-            t_df.to_csv(dest_path, index=False)
+        db_dump.dump_database(
+            db.engine,
+            stage_name,
+            dump_out,
+            dump_format=dump_format,
+            chunk_size=chunk_size,
+        )
 
     if delay > 0:
         threading.Timer(
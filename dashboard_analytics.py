@@ -0,0 +1,134 @@
+"""
+Statistics of the student dashboard, computed for all the users at once.
+
+All the evaluations are loaded with a single query, and the ranks, score statistics
+and daily submission counts of every user are computed with vectorized operations.
+The app keeps the result in its LeaderboardCache until the next evaluation is
+committed: opening a student page only looks up the precomputed values of its user.
+"""
+import numpy as np
+import pandas as pd
+
+from competition_tools import score_mapper
+from models import Evaluation, Submission
+
+TRIM_PROPORTION = 0.1  # cut from each end of the scores for the trimmed means
+
+
+def load_evaluations(db):
+    """Every evaluation as a DataFrame (user_id, timestamp, public, private)."""
+    evaluations = pd.DataFrame(
+        db.session.query(
+            Submission.user_id,
+            Submission.timestamp,
+            Evaluation.evaluation_public,
+            Evaluation.evaluation_private,
+        )
+        .join(Evaluation)
+        .all(),
+        columns=["user_id", "timestamp", "public", "private"],
+    )
+    evaluations["timestamp"] = pd.to_datetime(evaluations["timestamp"])
+    evaluations[["public", "private"]] = (
+        evaluations[["public", "private"]]
+        .astype(float)
+        .replace([np.inf, -np.inf], np.nan)
+    )
+    return evaluations
+
+
+def trimmed_means(groups, column, proportion=TRIM_PROPORTION):
+    """Per-group means of `column` without the `proportion` lowest and highest values."""
+    sorted_scores = groups.obj.sort_values(["user_id", column])
+    sorted_groups = sorted_scores.groupby("user_id", sort=False)
+    position = sorted_groups.cumcount()
+    size = sorted_groups[column].transform("size")
+    cut = np.floor(size * proportion)  # as scipy.stats.trim_mean
+    kept = sorted_scores[(position >= cut) & (position < size - cut)]
+    return kept.groupby("user_id")[column].mean()
+
+
+class DashboardAnalytics:
+    """
+    KPIs of every user with evaluations: positions, score statistics, daily counts.
+
+    `leaderboard` lists the users with both a public and a private score, in the order
+    of the public leaderboard. `user_kpis(user_id)` returns the values shown by the
+    student dashboard for `user_id`.
+    """
+
+    def __init__(self, evaluations, private_leaderboard, maximized_score=True):
+        best = "max" if maximized_score else "min"
+        groups = evaluations.groupby("user_id")
+
+        kpis = groups.agg(
+            n_submissions=("public", "size"),
+            best_public=("public", best),
+            std_public=("public", "std"),
+            best_private=("private", best),
+            std_private=("private", "std"),
+        )
+        kpis["avg_public"] = trimmed_means(groups, "public")
+        kpis["avg_private"] = trimmed_means(groups, "private")
+
+        # the public leaderboard order: best score first, ties by user_id
+        kpis = kpis.reset_index().sort_values(
+            ["best_public", "user_id"], ascending=[not maximized_score, True]
+        )
+        private = pd.DataFrame(private_leaderboard, columns=["user_id", "private"])
+        private["priv_position"] = np.arange(1, len(private) + 1)
+        kpis = kpis.merge(private, on="user_id").set_index("user_id")
+        kpis["pub_position"] = np.arange(1, len(kpis) + 1)
+        self.kpis = kpis
+
+        self.leaderboard = {
+            position: dict(
+                user_id=user_id, public=score_mapper(public), private=private_score
+            )
+            for position, (user_id, public, private_score) in enumerate(
+                zip(kpis.index, kpis["best_public"], kpis["private"])
+            )
+        }
+
+        # each user's evaluations (best public first) and daily submission counts
+        self.scores = evaluations.sort_values(
+            ["user_id", "public"], ascending=[True, not maximized_score], kind="stable"
+        ).set_index("user_id")
+        days = evaluations["timestamp"].dt.floor("D").rename("timestamp")
+        self.daily_counts = (
+            evaluations.groupby([evaluations["user_id"], days])
+            .size()
+            .rename("count")
+            .reset_index("timestamp")
+        )
+
+    def user_kpis(self, user_id):
+        """Template values of the dashboard of `user_id`, raises if it has no scores."""
+        if user_id not in self.kpis.index:
+            raise Exception(f"User {user_id} not found.")
+        kpis = self.kpis.loc[user_id]
+
+        user_scores = self.scores.loc[[user_id]].reset_index()
+        daily_counts = self.daily_counts.loc[[user_id]].set_index("timestamp")
+        # days without submissions are shown too
+        daily_counts = daily_counts.reindex(
+            pd.date_range(daily_counts.index.min(), daily_counts.index.max(), freq="D"),
+            fill_value=0,
+        )
+
+        return dict(
+            pub_position=int(kpis["pub_position"]),
+            priv_position=int(kpis["priv_position"]),
+            priv_score_on_leaderboard=kpis["private"],
+            n_submissions=int(kpis["n_submissions"]),
+            max_public=score_mapper(kpis["best_public"]),
+            avg_public=score_mapper(kpis["avg_public"]),
+            std_public=score_mapper(kpis["std_public"]),
+            max_private=score_mapper(kpis["best_private"]),
+            avg_private=score_mapper(kpis["avg_private"]),
+            std_private=score_mapper(kpis["std_private"]),
+            user_scores=user_scores.to_json(orient="index"),
+            user_scores_sub_freq=daily_counts.rename_axis("timestamp")
+            .reset_index()
+            .to_json(orient="index"),
+        )
@@ -0,0 +1,179 @@
+"""
+Streaming dumps of the competition database.
+
+Dumps are taken when the competition closes, while the server is busiest: tables are
+never loaded whole. Rows are read with a server-side cursor (where the backend has
+one) and written in chunks of `chunk_size`, so memory use does not depend on the
+table size. Every file is written under a temporary name and renamed when complete,
+and a JSON manifest records the row count and the SHA-256 of each file.
+"""
+import csv
+import datetime
+import gzip
+import hashlib
+import json
+import os
+
+from sqlalchemy import (
+    Boolean,
+    DateTime,
+    Float,
+    Integer,
+    LargeBinary,
+    MetaData,
+    Numeric,
+    select,
+    type_coerce,
+)
+
+DUMP_FORMATS = ("csv", "csv.gz", "parquet")
+
+
+def _sha256(path, block_size=1024 * 1024):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(block_size), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+class CsvWriter:
+    def __init__(self, path, table, compress=False):
+        if compress:
+            self._file = gzip.open(path, "wt", newline="")
+        else:
+            self._file = open(path, "w", newline="")
+        self._writer = csv.writer(self._file)
+        self._writer.writerow([c.name for c in table.columns])
+        # binary values are written as hex strings
+        self._binary = [
+            i for i, c in enumerate(table.columns) if isinstance(c.type, LargeBinary)
+        ]
+
+    def write(self, rows):
+        if self._binary:
+            rows = [list(row) for row in rows]
+            for row in rows:
+                for i in self._binary:
+                    row[i] = bytes(row[i]).hex() if row[i] is not None else None
+        self._writer.writerows(rows)
+
+    def close(self):
+        self._file.close()
+
+
+class ParquetWriter:
+    def __init__(self, path, table):
+        try:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+        except ImportError:
+            raise Exception("Parquet dumps require pyarrow: pip install pyarrow")
+
+        self._pa = pa
+        self._schema = pa.schema(
+            [(c.name, self._arrow_type(c.type)) for c in table.columns]
+        )
+        self._writer = pq.ParquetWriter(path, self._schema)
+
+    def _arrow_type(self, column_type):
+        pa = self._pa
+        if isinstance(column_type, Boolean):
+            return pa.bool_()
+        if isinstance(column_type, Integer):
+            return pa.int64()
+        if isinstance(column_type, Numeric):
+            return pa.float64()
+        if isinstance(column_type, DateTime):
+            return pa.timestamp("us")
+        if isinstance(column_type, LargeBinary):
+            return pa.binary()
+        return pa.string()
+
+    def write(self, rows):
+        columns = list(zip(*rows))
+        self._writer.write_table(
+            self._pa.Table.from_arrays(
+                [
+                    self._pa.array(values, type=field.type)
+                    for values, field in zip(columns, self._schema)
+                ],
+                schema=self._schema,
+            )
+        )
+
+    def close(self):
+        self._writer.close()
+
+
+def _writer(path, table, dump_format):
+    if dump_format == "csv":
+        return CsvWriter(path, table)
+    if dump_format == "csv.gz":
+        return CsvWriter(path, table, compress=True)
+    if dump_format == "parquet":
+        return ParquetWriter(path, table)
+    raise Exception(f"Unknown dump format '{dump_format}'! Use one of {DUMP_FORMATS}")
+
+
+def dump_table(engine, table, dest_path, dump_format="csv", chunk_size=10000):
+    """Streams `table` to `dest_path` and returns the number of rows written."""
+    # decimal values are dumped as floats, as pandas did
+    columns = [
+        (
+            type_coerce(c, Float()).label(c.name)
+            if isinstance(c.type, Numeric) and not isinstance(c.type, Float)
+            else c
+        )
+        for c in table.columns
+    ]
+
+    tmp_path = dest_path + ".tmp"
+    rows = 0
+    try:
+        writer = _writer(tmp_path, table, dump_format)
+        try:
+            with engine.connect() as conn:
+                result = conn.execution_options(stream_results=True).execute(
+                    select(*columns)
+                )
+                for chunk in result.partitions(chunk_size):
+                    writer.write(chunk)
+                    rows += len(chunk)
+        finally:
+            writer.close()
+        os.replace(tmp_path, dest_path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+    return rows
+
+
+def dump_database(engine, stage_name, dump_out, dump_format="csv", chunk_size=10000):
+    """Dumps every table to `dump_out` and returns the path of the manifest."""
+    dump_time = datetime.datetime.utcnow().strftime("%Y%m%d%H%M%S")
+    metadata = MetaData()
+    metadata.reflect(bind=engine)
+
+    manifest = dict(
+        stage=stage_name, dump_time=dump_time, format=dump_format, tables=dict()
+    )
+    for table in metadata.sorted_tables:
+        dest_path = os.path.join(
+            dump_out, f"{table.name}_{stage_name}_{dump_time}_dump.{dump_format}"
+        )
+
+        print(f"Dumping {table.name} to {dest_path}")
+        rows = dump_table(engine, table, dest_path, dump_format, chunk_size)
+        manifest["tables"][table.name] = dict(
+            file=os.path.basename(dest_path), rows=rows, sha256=_sha256(dest_path)
+        )
+
+    manifest_path = os.path.join(dump_out, f"{stage_name}_{dump_time}_manifest.json")
+    with open(manifest_path + ".tmp", "w") as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(manifest_path + ".tmp", manifest_path)
+    print(f"Dump manifest written to {manifest_path}")
+
+    return manifest_path
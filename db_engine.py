@@ -0,0 +1,67 @@
+"""
+Database engine setup.
+
+Any SQLAlchemy URL can be used for the competition database. CherryPy serves the
+requests from a pool of threads: the engine keeps a pool of open connections for them.
+On SQLite every new connection is tuned so that readers are never blocked by a writer
+(WAL journal) and writers wait for the lock instead of failing with "database is
+locked" (busy timeout). Server databases (e.g. PostgreSQL) get a pool whose
+connections are checked before use, since the server may close them.
+"""
+
+from sqlalchemy import event
+from sqlalchemy.engine import make_url
+from sqlalchemy.pool import QueuePool
+
+
+def is_sqlite(database_uri):
+    return make_url(database_uri).get_backend_name() == "sqlite"
+
+
+def is_sqlite_file(database_uri):
+    return is_sqlite(database_uri) and make_url(database_uri).database not in (
+        None,
+        "",
+        ":memory:",
+    )
+
+
+def engine_options(config):
+    options = dict()
+    database_uri = config["SQLALCHEMY_DATABASE_URI"]
+
+    if is_sqlite_file(database_uri):
+        options.update(
+            poolclass=QueuePool,
+            pool_size=config["DB_POOL_SIZE"],
+            max_overflow=config["DB_MAX_OVERFLOW"],
+            # pooled connections are used by several threads, one at a time
+            connect_args=dict(check_same_thread=False),
+        )
+    elif not is_sqlite(database_uri):
+        options.update(
+            pool_size=config["DB_POOL_SIZE"],
+            max_overflow=config["DB_MAX_OVERFLOW"],
+            pool_pre_ping=True,
+            pool_recycle=3600,
+            connect_args=dict(config.get("DB_CONNECT_ARGS", dict())),
+        )
+    return options
+
+
+def set_sqlite_pragmas(engine, pragmas):
+    @event.listens_for(engine, "connect")
+    def on_connect(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        for name, value in pragmas.items():
+            cursor.execute(f"PRAGMA {name}={value}")
+        cursor.close()
+
+
+def init_app(app, db):
+    app.config["SQLALCHEMY_ENGINE_OPTIONS"] = engine_options(app.config)
+    db.init_app(app)
+
+    with app.app_context():
+        if is_sqlite_file(app.config["SQLALCHEMY_DATABASE_URI"]):
+            set_sqlite_pragmas(db.engine, app.config["SQLITE_PRAGMAS"])
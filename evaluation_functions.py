@@ -1,13 +1,186 @@
 """
-Use this module to set the evaluation fuction. 
+Use this module to set the evaluation metrics.
 
-- evaluator: the evaluation function used to assign scores
+- METRICS: the available metrics, each one declaring its direction
+- metric_names: the metrics computed for every submission, the first one ranks the
+  leaderboards
+- evaluator: the evaluation function used to assign scores (the primary metric)
 - evaluator_name: a plain name
 - to_maximize: boolean used to sort properly the leaderboard
+
+All the metrics of a submission are computed together on a MetricContext: the work
+shared by several metrics (class counts, residuals, ranks) is done once.
+
+Metrics averaging a score per sample declare it as `pointwise`: their bootstrap
+confidence intervals are computed on a bank of resamples with a single take.
 """
-from sklearn.metrics import accuracy_score
+from collections import namedtuple
+from functools import cached_property
+
+import numpy as np
+
+
+class MetricContext:
+    """Quantities shared by the metrics of one (y_true, y_pred) pair, computed on first use."""
+
+    def __init__(self, y_true, y_pred):
+        self.y_true = np.asarray(y_true)
+        self.y_pred = np.asarray(y_pred)
+        if self.y_true.shape != self.y_pred.shape:
+            raise Exception(
+                f"Found {len(self.y_pred)} predictions for {len(self.y_true)} targets."
+            )
+
+    @cached_property
+    def correct(self):
+        return self.y_true == self.y_pred
+
+    @cached_property
+    def class_counts(self):
+        """
+        Per label of both arrays: true positives, actual and predicted counts.
+
+        The diagonal and the margins of the confusion matrix, without its k x k cells:
+        a submission may predict as many labels as rows.
+        """
+        labels, codes = np.unique(
+            np.concatenate([self.y_true, self.y_pred]), return_inverse=True
+        )
+        n, k = len(self.y_true), len(labels)
+        true_codes, pred_codes = codes[:n], codes[n:]
+        true_positives = np.bincount(true_codes[self.correct], minlength=k)
+        actual = np.bincount(true_codes, minlength=k)
+        predicted = np.bincount(pred_codes, minlength=k)
+        return true_positives, actual, predicted
+
+    @cached_property
+    def residuals(self):
+        return self.y_pred.astype(float) - self.y_true
+
+    @cached_property
+    def squared_error(self):
+        return np.mean(self.residuals**2)
+
+    @cached_property
+    def ranks(self):
+        """Ranks of the predictions, averaged between ties."""
+        order = np.argsort(self.y_pred, kind="mergesort")
+        _, first, counts = np.unique(
+            self.y_pred[order], return_index=True, return_counts=True
+        )
+        ranks = np.empty(len(order))
+        ranks[order] = np.repeat(first + (counts + 1) / 2, counts)
+        return ranks
+
+
+def _f1_macro(context):
+    true_positives, actual, predicted = context.class_counts
+    support = actual + predicted
+    f1 = np.divide(
+        2 * true_positives,
+        support,
+        out=np.zeros(len(support)),
+        where=support > 0,
+    )
+    return f1.mean()
+
+
+def _balanced_accuracy(context):
+    true_positives, actual, _ = context.class_counts
+    return np.mean(true_positives[actual > 0] / actual[actual > 0])
+
+
+def _roc_auc(context):
+    labels = np.unique(context.y_true)
+    if len(labels) != 2:
+        return np.nan  # defined only for binary targets
+    positive = context.y_true == labels[1]
+    n_positive = positive.sum()
+    n_negative = len(positive) - n_positive
+    return (context.ranks[positive].sum() - n_positive * (n_positive + 1) / 2) / (
+        n_positive * n_negative
+    )
+
+
+def _r2(context):
+    total = np.sum((context.y_true - np.mean(context.y_true)) ** 2)
+    return 1 - context.squared_error * len(context.y_true) / total
+
+
+class Metric(
+    namedtuple(
+        "Metric",
+        ["name", "label", "maximize", "compute", "pointwise"],
+        defaults=[None],
+    )
+):
+    def __call__(self, y_true, y_pred):
+        return self.compute(MetricContext(y_true, y_pred))
+
+
+METRICS = {
+    metric.name: metric
+    for metric in [
+        Metric(
+            "accuracy",
+            "Accuracy",
+            True,
+            lambda c: np.mean(c.correct),
+            pointwise=lambda c: c.correct,
+        ),
+        Metric("balanced_accuracy", "Balanced accuracy", True, _balanced_accuracy),
+        Metric("f1_macro", "F1 (macro)", True, _f1_macro),
+        Metric("roc_auc", "ROC AUC", True, _roc_auc),
+        Metric(
+            "mae",
+            "MAE",
+            False,
+            lambda c: np.mean(np.abs(c.residuals)),
+            pointwise=lambda c: np.abs(c.residuals),
+        ),
+        Metric(
+            "mse",
+            "MSE",
+            False,
+            lambda c: c.squared_error,
+            pointwise=lambda c: c.residuals**2,
+        ),
+        Metric("rmse", "RMSE", False, lambda c: np.sqrt(c.squared_error)),
+        Metric("r2", "R2", True, _r2),
+    ]
+}
+
+
+def compute_metrics(y_true, y_pred, names):
+    """Computes the metrics `names` on a shared context, returns {name: score}."""
+    context = MetricContext(y_true, y_pred)
+    return {name: float(METRICS[name].compute(context)) for name in names}
+
+
+def bootstrap_interval(y_true, y_pred, bank, name, level=0.95):
+    """
+    Bootstrap confidence interval of the metric `name`, None if it is not pointwise.
+
+    Each row of `bank` holds the indices of one resample, drawn with replacement: all the
+    resamples are scored with a single take. With m indices out of n samples the spread
+    of the replicates is rescaled by sqrt(m / n) (m-out-of-n bootstrap).
+    Returns (low, high, replicates), the replicates rescaled around the score.
+    """
+    metric = METRICS[name]
+    if metric.pointwise is None:
+        return None
+
+    values = metric.pointwise(MetricContext(y_true, y_pred))
+    score = np.mean(values)
+    scale = np.sqrt(bank.shape[1] / len(values))
+    replicates = score + scale * (values.take(bank).mean(axis=1) - score)
+    low, high = np.quantile(replicates, [(1 - level) / 2, (1 + level) / 2])
+    return float(low), float(high), replicates.astype(np.float32)
+
 
+metric_names = ["accuracy", "balanced_accuracy", "f1_macro"]
+primary_metric = metric_names[0]
 
-evaluator = accuracy_score
-evaluator_name = "Accuracy"
-to_maximize = True
+evaluator = METRICS[primary_metric]
+evaluator_name = evaluator.label
+to_maximize = evaluator.maximize
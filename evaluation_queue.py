@@ -0,0 +1,127 @@
+"""
+Asynchronous scoring of the accepted submissions.
+
+Uploads are validated in the request thread and then enqueued here: a bounded job
+queue is served by a pool of worker processes, each one holding its own copy of the
+solution. The request thread never waits for the evaluator. A worker that dies (e.g.
+killed when out of memory) breaks the whole pool: it is started again, and its job
+retried once.
+"""
+import multiprocessing
+import queue
+import threading
+import traceback
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from competition_tools import SolutionStore, evaluate_predictions
+from models import SubmissionStatus
+
+# Solution loaded once by each worker process
+_worker_solution_store = None
+
+
+def _init_worker(solution_file):
+    global _worker_solution_store
+    _worker_solution_store = SolutionStore(solution_file)
+
+
+def _score(y_pred):
+    return evaluate_predictions(y_pred, _worker_solution_store.get())
+
+
+class EvaluationQueue:
+    """
+    Scores submissions in `workers` processes, keeping at most `max_pending` jobs waiting.
+
+    `on_status(submission_id, status, scores)` is called from a dispatcher thread
+    whenever a job changes state; `scores` is the Scores of the submission (metrics
+    and public bootstrap interval) once the job is SCORED and is None otherwise.
+    With `workers=0` jobs are scored synchronously in the caller thread.
+
+    The workers are forked when the queue is created, before the web server starts its
+    threads, and again when the pool is restarted. Only the forking thread runs in the
+    workers: the threads already running (e.g. the roster watcher of ApiAuth, or the
+    server threads at a restart) are not copied, the workers only load the solution
+    and score.
+    """
+
+    def __init__(self, solution_file, on_status, workers=2, max_pending=100):
+        self.on_status = on_status
+        self.workers = workers
+        self.solution_file = solution_file
+        self._jobs = queue.Queue(maxsize=max_pending)
+
+        if workers > 0:
+            self._pool = self._start_pool()
+            self._pool_lock = threading.Lock()
+            for _ in range(workers):
+                threading.Thread(target=self._dispatch, daemon=True).start()
+        else:
+            _init_worker(solution_file)
+
+    def _start_pool(self):
+        pool = ProcessPoolExecutor(
+            max_workers=self.workers,
+            mp_context=multiprocessing.get_context("fork"),
+            initializer=_init_worker,
+            initargs=(self.solution_file,),
+        )
+        # every worker loads the solution before the first job
+        for f in [pool.submit(int) for _ in range(self.workers)]:
+            f.result()
+        return pool
+
+    def _restart_pool(self, broken_pool):
+        with self._pool_lock:
+            # the other dispatchers may have restarted it already
+            if self._pool is broken_pool:
+                print("An evaluation worker died: restarting the evaluation workers...")
+                broken_pool.shutdown(wait=False)
+                self._pool = self._start_pool()
+
+    def _score_in_pool(self, y_pred):
+        pool = self._pool
+        try:
+            return pool.submit(_score, y_pred).result()
+        except BrokenProcessPool:
+            traceback.print_exc()
+            self._restart_pool(pool)
+            # retried once: a submission killing its worker again is FAILED
+            return self._pool.submit(_score, y_pred).result()
+
+    def submit(self, submission_id, y_pred):
+        if self.workers == 0:
+            self._run(submission_id, lambda: _score(y_pred))
+            return
+
+        try:
+            self._jobs.put_nowait((submission_id, y_pred))
+        except queue.Full:
+            raise Exception(
+                "Too many submissions are waiting to be evaluated. Please try again in a few minutes."
+            )
+
+    def pending(self):
+        return self._jobs.qsize()
+
+    def _dispatch(self):
+        while True:
+            submission_id, y_pred = self._jobs.get()
+            try:
+                self._run(submission_id, lambda: self._score_in_pool(y_pred))
+            except Exception:
+                # the dispatcher must survive errors raised while storing the status
+                traceback.print_exc()
+            finally:
+                self._jobs.task_done()
+
+    def _run(self, submission_id, score):
+        try:
+            self.on_status(submission_id, SubmissionStatus.RUNNING, None)
+            scores = score()
+        except Exception:
+            traceback.print_exc()
+            self.on_status(submission_id, SubmissionStatus.FAILED, None)
+        else:
+            self.on_status(submission_id, SubmissionStatus.SCORED, scores)
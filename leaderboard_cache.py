@@ -0,0 +1,44 @@
+import secrets
+import threading
+from datetime import datetime
+
+
+class LeaderboardCache:
+    """
+    Versioned cache of values derived from the leaderboards.
+
+    Entries are computed on first use and served until `invalidate` bumps the
+    version, which must happen right after a new Evaluation, or a change of the
+    selected submissions, is committed.
+    A value computed while the version changes is returned but not stored, so a
+    stale leaderboard can never outlive the invalidation.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._entries = dict()
+        # distinguishes the versions of different server runs in the ETags
+        self._token = secrets.token_hex(4)
+        self.version = 0
+        self.last_modified = datetime.utcnow().replace(microsecond=0)
+
+    def get(self, key, compute):
+        version = self.version
+        entry = self._entries.get(key)
+        if entry is not None and entry[0] == version:
+            return entry[1]
+
+        value = compute()
+        with self._lock:
+            if self.version == version:
+                self._entries[key] = (version, value)
+        return value
+
+    def invalidate(self):
+        with self._lock:
+            self.version += 1
+            self.last_modified = datetime.utcnow().replace(microsecond=0)
+            self._entries = dict()
+
+    def etag(self, *variant):
+        return "-".join([self._token, str(self.version)] + [str(v) for v in variant])
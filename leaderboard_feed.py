@@ -0,0 +1,127 @@
+"""
+Server-Sent Events feed of the public leaderboard changes.
+
+A single publisher keeps the recent events in a ring buffer and wakes every
+subscriber with one condition variable: an idle connection costs a sleeping thread,
+no database work. Clients resume from the id of the last event they received
+(`Last-Event-ID`), or are told to reload the leaderboard if it is no longer buffered.
+"""
+import json
+import secrets
+import threading
+import time
+from collections import deque
+
+
+def format_event(event_id, event, data):
+    return f"id: {event_id}\nevent: {event}\ndata: {data}\n\n"
+
+
+class LeaderboardFeed:
+    """
+    Broadcasts leaderboard deltas to at most `max_clients` streams.
+
+    Every server thread streaming events is taken from the web server pool, so the
+    number of streams is bounded and each one ends after `max_duration` seconds:
+    the clients reconnect after `retry` seconds and resume from their last event.
+    Clients over the limit are sent back to retry later.
+    """
+
+    def __init__(
+        self, buffer_size=1000, max_clients=50, heartbeat=15, max_duration=300, retry=5
+    ):
+        self.heartbeat = heartbeat
+        self.max_duration = max_duration
+        self.retry = retry
+        self.max_clients = max_clients
+        self._condition = threading.Condition()
+        self._events = deque(maxlen=buffer_size)  # (number, formatted event)
+        self._number = 0
+        self._clients = 0
+        # event ids of a previous server run are never resumed
+        self._token = secrets.token_hex(4)
+
+    @property
+    def clients(self):
+        return self._clients
+
+    @property
+    def last_event_id(self):
+        """Id of the last event published: a stream resumed from it misses none after."""
+        with self._condition:
+            return f"{self._token}-{self._number}"
+
+    def publish(self, event, **data):
+        with self._condition:
+            self._number += 1
+            event_id = f"{self._token}-{self._number}"
+            payload = json.dumps(data, separators=(",", ":"))
+            self._events.append((self._number, format_event(event_id, event, payload)))
+            self._condition.notify_all()
+
+    def _resume_from(self, last_event_id):
+        """Number of the last event received by the client, None if it cannot resume."""
+        if last_event_id is None:
+            return self._number
+        token, _, number = last_event_id.rpartition("-")
+        if token != self._token or not number.isdigit() or int(number) > self._number:
+            return None
+        oldest = self._events[0][0] if self._events else self._number + 1
+        if int(number) < oldest - 1:
+            return None  # some events were dropped from the buffer
+        return int(number)
+
+    def _wait(self, number):
+        """
+        Waits up to `heartbeat` seconds for the events after `number`.
+
+        Returns (the events, the number of the last one), or None if some of them were
+        already dropped from the buffer.
+        """
+        with self._condition:
+            if self._number == number:
+                self._condition.wait(self.heartbeat)
+            if self._resume_from(f"{self._token}-{number}") is None:
+                return None
+            # the buffer is short and ordered: scan it from the newest event
+            events = []
+            for event_number, event in reversed(self._events):
+                if event_number <= number:
+                    break
+                events.append(event)
+            return events[::-1], self._number
+
+    def stream(self, last_event_id=None):
+        """Generator of the SSE messages for a client that received `last_event_id`."""
+        with self._condition:
+            busy = self._clients >= self.max_clients
+            if not busy:
+                self._clients += 1
+                number = self._resume_from(last_event_id)
+        if busy:
+            # the clients back off before trying again
+            yield f"retry: {self.retry * 4 * 1000}\n\n"
+            return
+
+        try:
+            yield f"retry: {self.retry * 1000}\n\n"
+            if number is None:
+                yield format_event(f"{self._token}-{self._number}", "reset", "{}")
+                return
+
+            deadline = time.monotonic() + self.max_duration
+            while time.monotonic() < deadline:
+                waited = self._wait(number)
+                if waited is None:
+                    # a slow client missed the events dropped from the buffer
+                    yield format_event(f"{self._token}-{self._number}", "reset", "{}")
+                    return
+                events, number = waited
+                if events:
+                    yield "".join(events)
+                else:
+                    # detects the closed connections, and keeps proxies from closing ours
+                    yield ": keepalive\n\n"
+        finally:
+            with self._condition:
+                self._clients -= 1
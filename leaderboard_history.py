@@ -0,0 +1,231 @@
+"""
+History of the public leaderboard, stored as compact deltas.
+
+An evaluation that improves the best public score of its user, as of the time of its
+submission, appends a LeaderboardDelta in the same transaction. Every
+`LEADERBOARD_CHECKPOINT_INTERVAL` deltas the whole board is stored in a
+LeaderboardCheckpoint: the board as of any time is rebuilt from the nearest
+checkpoint and the deltas after it, without reading the evaluations.
+
+A board maps every user to the best score of its deltas, so the deltas can be
+applied in any order (e.g. when submissions are scored out of order). The
+transactions appending deltas are serialized until they commit: a checkpoint always
+sees every delta with a lower id.
+"""
+import json
+import zlib
+
+import numpy as np
+from sqlalchemy import func, text
+
+from config import CompetitionConfig
+from models import Evaluation, LeaderboardCheckpoint, LeaderboardDelta, Submission
+
+# PostgreSQL advisory lock of the transactions appending deltas ("LBHI")
+HISTORY_LOCK = 0x4C424849
+
+
+def _is_better(score, best, maximized_score):
+    return score > best if maximized_score else score < best
+
+
+def encode_board(board):
+    return zlib.compress(json.dumps(board, separators=(",", ":")).encode())
+
+
+def decode_board(data):
+    return json.loads(zlib.decompress(data))
+
+
+def apply_deltas(board, deltas, maximized_score=True):
+    """Updates `board` {user_id: best score} with the (user_id, score) deltas."""
+    for user_id, score in deltas:
+        score = float(score)
+        best = board.get(user_id)
+        if best is None or _is_better(score, best, maximized_score):
+            board[user_id] = score
+    return board
+
+
+def ranked(board, maximized_score=True):
+    """[(user_id, score)] of `board`, in the order of the public leaderboard."""
+    return sorted(
+        board.items(),
+        key=lambda item: (-item[1] if maximized_score else item[1], item[0]),
+    )
+
+
+def _nearest_checkpoint(db, time=None, delta_id=None):
+    query = db.session.query(LeaderboardCheckpoint)
+    if time is not None:
+        query = query.filter(LeaderboardCheckpoint.time <= time)
+    if delta_id is not None:
+        query = query.filter(LeaderboardCheckpoint.delta_id <= delta_id)
+    return query.order_by(LeaderboardCheckpoint.delta_id.desc()).first()
+
+
+def _lock_history(db):
+    """
+    Waits for the other transactions appending deltas to commit, and keeps them waiting
+    until this one ends. SQLite serializes its writing transactions by itself.
+    """
+    if db.session.connection().dialect.name == "postgresql":
+        db.session.execute(
+            text("SELECT pg_advisory_xact_lock(:key)"), dict(key=HISTORY_LOCK)
+        )
+
+
+def record_delta(db, submission, public_score, maximized_score=True):
+    """
+    Appends a delta if `public_score` improves the board of its user at the time of
+    the submission, and a checkpoint when they are due. Left to the caller to commit.
+    """
+    _lock_history(db)
+    best = func.max if maximized_score else func.min
+    best_score = (
+        db.session.query(best(LeaderboardDelta.score))
+        .filter(
+            LeaderboardDelta.user_id == submission.user_id,
+            LeaderboardDelta.time <= submission.timestamp,
+        )
+        .scalar()
+    )
+    if best_score is not None and not _is_better(
+        public_score, float(best_score), maximized_score
+    ):
+        return None
+
+    delta = LeaderboardDelta(
+        time=submission.timestamp, user_id=submission.user_id, score=public_score
+    )
+    db.session.add(delta)
+    db.session.flush()
+
+    last_checkpoint = db.session.query(
+        func.max(LeaderboardCheckpoint.delta_id)
+    ).scalar()
+    if (
+        delta.id - (last_checkpoint or 0)
+        >= CompetitionConfig.LEADERBOARD_CHECKPOINT_INTERVAL
+    ):
+        write_checkpoint(db, delta.id, maximized_score)
+    return delta
+
+
+def write_checkpoint(db, delta_id, maximized_score=True):
+    """Stores the board of the deltas up to `delta_id`."""
+    checkpoint = _nearest_checkpoint(db, delta_id=delta_id - 1)
+    board, time, after = dict(), None, 0
+    if checkpoint is not None:
+        board = decode_board(checkpoint.board)
+        time, after = checkpoint.time, checkpoint.delta_id
+
+    deltas = (
+        db.session.query(
+            LeaderboardDelta.time, LeaderboardDelta.user_id, LeaderboardDelta.score
+        )
+        .filter(LeaderboardDelta.id > after, LeaderboardDelta.id <= delta_id)
+        .all()
+    )
+    apply_deltas(
+        board, [(user_id, score) for _, user_id, score in deltas], maximized_score
+    )
+    # valid from the time of the latest delta it includes
+    time = max([t for t, _, _ in deltas] + ([time] if time is not None else []))
+    db.session.add(
+        LeaderboardCheckpoint(delta_id=delta_id, time=time, board=encode_board(board))
+    )
+
+
+def board_as_of(db, time, maximized_score=True):
+    """The public leaderboard [(user_id, score)] of the submissions made until `time`."""
+    checkpoint = _nearest_checkpoint(db, time=time)
+    board, after = dict(), 0
+    if checkpoint is not None:
+        board, after = decode_board(checkpoint.board), checkpoint.delta_id
+
+    deltas = (
+        db.session.query(LeaderboardDelta.user_id, LeaderboardDelta.score)
+        .filter(LeaderboardDelta.id > after, LeaderboardDelta.time <= time)
+        .all()
+    )
+    return ranked(apply_deltas(board, deltas, maximized_score), maximized_score)
+
+
+def timeline(db, times, maximized_score=True):
+    """
+    The public leaderboard at each of the sorted `times`, summarized.
+
+    Returns [dict(time, participants, best, median)], with the best score on the
+    leaderboard and the median of the best scores of the users.
+    """
+    deltas = (
+        db.session.query(
+            LeaderboardDelta.time, LeaderboardDelta.user_id, LeaderboardDelta.score
+        )
+        .order_by(LeaderboardDelta.time, LeaderboardDelta.id)
+        .all()
+    )
+
+    board, points, position = dict(), [], 0
+    for time in times:
+        while position < len(deltas) and deltas[position][0] <= time:
+            apply_deltas(board, [deltas[position][1:]], maximized_score)
+            position += 1
+        scores = list(board.values())
+        points.append(
+            dict(
+                time=time,
+                participants=len(scores),
+                best=(max if maximized_score else min)(scores) if scores else None,
+                median=float(np.median(scores)) if scores else None,
+            )
+        )
+    return points
+
+
+def rebuild(db, maximized_score=True):
+    """Replaces the history with the one of the stored evaluations (e.g. after a re-scoring)."""
+    evaluations = (
+        db.session.query(
+            Submission.timestamp, Submission.user_id, Evaluation.evaluation_public
+        )
+        .join(Evaluation)
+        .order_by(Submission.timestamp, Submission.id)
+        .all()
+    )
+    db.session.query(LeaderboardCheckpoint).delete(synchronize_session=False)
+    db.session.query(LeaderboardDelta).delete(synchronize_session=False)
+
+    board, deltas = dict(), []
+    for time, user_id, score in evaluations:
+        score = float(score)
+        if user_id not in board or _is_better(score, board[user_id], maximized_score):
+            board[user_id] = score
+            deltas.append(LeaderboardDelta(time=time, user_id=user_id, score=score))
+    db.session.add_all(deltas)
+    db.session.flush()
+
+    # in timestamp order every delta is an improvement: the boards are the running ones
+    interval = CompetitionConfig.LEADERBOARD_CHECKPOINT_INTERVAL
+    board = dict()
+    for position, delta in enumerate(deltas, 1):
+        board[delta.user_id] = delta.score
+        if position % interval == 0:
+            db.session.add(
+                LeaderboardCheckpoint(
+                    delta_id=delta.id, time=delta.time, board=encode_board(board)
+                )
+            )
+    db.session.commit()
+
+
+def backfill(db, maximized_score=True):
+    """Builds the history of a database with evaluations recorded before it existed."""
+    if db.session.query(LeaderboardDelta.id).first() is not None:
+        return False
+    if db.session.query(Evaluation.submission_id).first() is None:
+        return False
+    print("Building the leaderboard history from the evaluations...")
+    rebuild(db, maximized_score=maximized_score)
+    return True
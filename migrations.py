@@ -0,0 +1,86 @@
+"""
+Versioned upgrades of the competition database.
+
+`db.create_all()` creates the missing tables but never alters the existing ones: every
+schema change to an existing table gets a migration here, identified by an increasing
+version number. Applied versions are recorded in the `schema_version` table, so each
+migration runs once per database. Migrations must also work on a database just created
+by `db.create_all()`, where the change is already in place.
+
+The app upgrades its database at startup. To upgrade a database offline (e.g. before
+restoring it on a running competition) run from the repository folder:
+
+    python migrations.py [--db sqlite:///path/to/competition.db]
+"""
+import argparse
+from datetime import datetime
+
+from sqlalchemy import create_engine, inspect, select, text
+
+from config import CompetitionConfig
+from models import Evaluation, SchemaVersion, Submission, SubmissionStatus
+
+
+def _add_submission_status(conn):
+    columns = [c["name"] for c in inspect(conn).get_columns("submission")]
+    if "status" not in columns:
+        # submissions stored before the evaluation queue were scored synchronously
+        conn.execute(
+            text(
+                "ALTER TABLE submission ADD COLUMN status VARCHAR(16) "
+                f"NOT NULL DEFAULT '{SubmissionStatus.SCORED}'"
+            )
+        )
+
+
+def _create_indexes(conn, table, index_names):
+    existing = [i["name"] for i in inspect(conn).get_indexes(table.name)]
+    for index in table.indexes:
+        if index.name in index_names and index.name not in existing:
+            index.create(conn)
+
+
+def _add_user_indexes(conn):
+    _create_indexes(conn, Submission.__table__, ["ix_submission_user_id_timestamp"])
+    _create_indexes(
+        conn, Evaluation.__table__, ["ix_evaluation_private_check_submission_id"]
+    )
+
+
+# (version, description, migration) - append only, never change an applied migration
+MIGRATIONS = [
+    (1, "add submission.status", _add_submission_status),
+    (2, "add per-user indexes on submission and evaluation", _add_user_indexes),
+]
+
+
+def upgrade(engine):
+    SchemaVersion.__table__.create(engine, checkfirst=True)
+    with engine.connect() as conn:
+        applied = set(conn.execute(select(SchemaVersion.version)).scalars())
+
+    for version, description, migrate in MIGRATIONS:
+        if version in applied:
+            continue
+
+        print(f"Applying database migration {version}: {description}...")
+        with engine.begin() as conn:
+            migrate(conn)
+            conn.execute(
+                SchemaVersion.__table__.insert().values(
+                    version=version, applied=datetime.utcnow()
+                )
+            )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "--db",
+        type=str,
+        default=CompetitionConfig.DB_FILE,
+        help="The SQLAlchemy URL of the database to upgrade (default config.DB_FILE)",
+    )
+    args = parser.parse_args()
+
+    upgrade(create_engine(args.db))
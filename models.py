@@ -5,11 +5,24 @@ from datetime import datetime
 db = SQLAlchemy()
 
 
+class SubmissionStatus:
+    QUEUED = "queued"
+    RUNNING = "running"
+    SCORED = "scored"
+    FAILED = "failed"
+
+
 class Submission(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.String(32), nullable=False)
     timestamp = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
     filename = db.Column(db.String(128), nullable=False)
+    status = db.Column(db.String(16), default=SubmissionStatus.QUEUED, nullable=False)
+
+    __table_args__ = (
+        # per-user lookups: rate limit, submissions page, selections
+        db.Index("ix_submission_user_id_timestamp", "user_id", "timestamp"),
+    )
 
     def __repr__(self):
         return f"<Submission ({self.user_id}, {self.timestamp})>"
@@ -24,3 +37,85 @@ class Evaluation(db.Model):
     evaluation_private = db.Column(db.Numeric, nullable=False)
     timestamp = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
     private_check = db.Column(db.Boolean, default=False, nullable=False)
+
+    __table_args__ = (
+        db.Index(
+            "ix_evaluation_private_check_submission_id",
+            "private_check",
+            "submission_id",
+        ),
+    )
+
+
+class EvaluationMetric(db.Model):
+    """Score of an Evaluation on every configured metric, the primary one included."""
+
+    submission_id = db.Column(
+        db.Integer, db.ForeignKey("evaluation.submission_id"), primary_key=True
+    )
+    evaluation = db.relationship("Evaluation", backref="metrics")
+    metric = db.Column(db.String(32), primary_key=True)
+    # undefined scores (e.g. ROC AUC with a single class) are stored as NULL
+    public = db.Column(db.Numeric)
+    private = db.Column(db.Numeric)
+
+
+class EvaluationBootstrap(db.Model):
+    """Bootstrap confidence interval of the public primary score of an Evaluation."""
+
+    submission_id = db.Column(
+        db.Integer, db.ForeignKey("evaluation.submission_id"), primary_key=True
+    )
+    evaluation = db.relationship(
+        "Evaluation", backref=db.backref("bootstrap", uselist=False)
+    )
+    ci_low = db.Column(db.Numeric, nullable=False)
+    ci_high = db.Column(db.Numeric, nullable=False)
+    # public scores on the shared resamples (float32), paired between submissions
+    replicates = db.Column(db.LargeBinary, nullable=False)
+
+
+class UserSummary(db.Model):
+    """Per-user aggregates of the evaluations, kept up to date when they change."""
+
+    user_id = db.Column(db.String(32), primary_key=True)
+    best_public = db.Column(db.Numeric, nullable=False)
+    best_submission_id = db.Column(
+        db.Integer, db.ForeignKey("submission.id"), nullable=False
+    )
+    submission_count = db.Column(db.Integer, default=0, nullable=False)
+    last_submission = db.Column(db.DateTime, nullable=False)
+    # best private score among the submissions selected for the final evaluation
+    best_private_selected = db.Column(db.Numeric, nullable=True)
+
+
+class LeaderboardDelta(db.Model):
+    """
+    Append-only history of the public leaderboard, see `leaderboard_history.py`.
+
+    A row is added each time a submission improves the best public score its user had
+    when it was made, `time` is the timestamp of the submission.
+    """
+
+    id = db.Column(db.Integer, primary_key=True)
+    time = db.Column(db.DateTime, nullable=False)
+    user_id = db.Column(db.String(32), nullable=False)
+    score = db.Column(db.Numeric, nullable=False)
+
+    __table_args__ = (db.Index("ix_leaderboard_delta_user_id_time", "user_id", "time"),)
+
+
+class LeaderboardCheckpoint(db.Model):
+    """Public leaderboard of the deltas up to `delta_id`, all made until `time`."""
+
+    delta_id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    time = db.Column(db.DateTime, nullable=False, index=True)
+    # zlib-compressed JSON {user_id: best public score}
+    board = db.Column(db.LargeBinary, nullable=False)
+
+
+class SchemaVersion(db.Model):
+    """Migrations applied to the database, see `migrations.py`."""
+
+    version = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    applied = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
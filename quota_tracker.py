@@ -0,0 +1,86 @@
+import threading
+from collections import namedtuple
+
+from sqlalchemy import func
+
+from models import Submission, SubmissionStatus
+
+# A submission slot booked by `reserve`: `previous` is the user's last submission time
+# before it, restored if the slot is given back
+Reservation = namedtuple("Reservation", ["user_id", "time", "previous"])
+
+
+class QuotaTracker:
+    """
+    Per-user submission quotas kept in memory: last submission time and count.
+
+    The state is warmed from the database at startup and then kept up to date by the
+    upload route, so limits are checked without queries. `reserve` checks both limits
+    and books a slot under one lock: of two concurrent uploads of the same user only
+    one can pass. Slots of submissions that are not stored, or whose evaluation fails,
+    are given back with `release`.
+    """
+
+    def __init__(self, time_between_submissions, max_submissions):
+        self.time_between_submissions = time_between_submissions
+        self.max_submissions = max_submissions
+        self._lock = threading.Lock()
+        self._users = dict()  # user_id -> (last submission time, count)
+
+    def warm(self, db):
+        """Loads the state of every user, failed submissions are not counted."""
+        users = (
+            db.session.query(
+                Submission.user_id,
+                func.max(Submission.timestamp),
+                func.count(Submission.id).filter(
+                    Submission.status != SubmissionStatus.FAILED
+                ),
+            )
+            .group_by(Submission.user_id)
+            .all()
+        )
+        with self._lock:
+            self._users = {
+                user_id: (last_submission, count)
+                for user_id, last_submission, count in users
+            }
+
+    def reserve(self, user_id, now):
+        """Books a submission of `user_id` at `now`, raises if a limit is exceeded."""
+        with self._lock:
+            last_submission, count = self._users.get(user_id, (None, 0))
+
+            if last_submission is not None:
+                elapsed = (now - last_submission).total_seconds()
+                if elapsed < self.time_between_submissions:
+                    # avoid messages such as "try again in 0/1/2 seconds" (TODO remove magic number 5)
+                    delta = max(5, int(self.time_between_submissions - elapsed))
+                    raise Exception(
+                        f"You are exceeding the {self.time_between_submissions} seconds limit between submissions. Please try again in {delta} seconds"
+                    )
+
+            if count >= self.max_submissions:
+                raise Exception(
+                    f"You are exceeding the max submissions limit of {self.max_submissions}. "
+                    f"You are no more allowed to submit any solution."
+                )
+
+            self._users[user_id] = (now, count + 1)
+            return Reservation(user_id, now, last_submission)
+
+    def release(self, user_id, reservation=None):
+        """
+        Gives back a submission slot of `user_id`.
+
+        With the `reservation` of a submission that was never stored, the time limit
+        is reset as well (unless a later submission was booked in the meantime).
+        """
+        with self._lock:
+            last_submission, count = self._users.get(user_id, (None, 0))
+            if reservation is not None and reservation.time == last_submission:
+                last_submission = reservation.previous
+            self._users[user_id] = (last_submission, max(count - 1, 0))
+
+    def submissions_left(self, user_id):
+        return self.max_submissions - self._users.get(user_id, (None, 0))[1]
@@ -0,0 +1,271 @@
+"""
+In-memory rankings of the public and private leaderboards.
+
+The boards are kept sorted by the same keys as the leaderboard queries of
+`competition_tools`, so a user's rank or a page of the leaderboard is found in
+O(log n) instead of sorting every score. They are rebuilt from the database at
+startup and updated when an evaluation or a selection of submissions is committed.
+"""
+import base64
+import json
+import threading
+from collections import namedtuple
+from operator import itemgetter
+
+from sortedcontainers import SortedKeyList
+
+from competition_tools import score_mapper
+from models import Evaluation, Submission, UserSummary
+
+# The evaluation defining the private score of a user without selected submissions:
+# the best public score before the close, the latest one in case of ties
+Candidate = namedtuple("Candidate", ["public", "timestamp", "private"])
+
+
+class Descending:
+    """Wraps a value to sort it in descending order inside an ascending key."""
+
+    __slots__ = ("value",)
+
+    def __init__(self, value):
+        self.value = value
+
+    def __lt__(self, other):
+        return other.value < self.value
+
+    def __eq__(self, other):
+        return self.value == other.value
+
+
+class RankIndex:
+    """
+    A leaderboard kept sorted by key: `set` moves a user in O(log n).
+
+    `key(score, user_id, *tiebreak)` must be unique for every user (e.g. it ends with
+    the user_id), the best user has the smallest key. The arguments of the key of a
+    row are also its cursor: `after(cursor)` returns the rows ranked below it.
+    """
+
+    def __init__(self, key):
+        self.key = key
+        self._entries = SortedKeyList(key=itemgetter(0))
+        self._users = dict()  # user_id -> its entry in the sorted list
+
+    def __len__(self):
+        return len(self._entries)
+
+    def set(self, user_id, score, *tiebreak):
+        entry = self._users.get(user_id)
+        if entry is not None:
+            self._entries.remove(entry)
+        cursor = (score, user_id) + tiebreak
+        entry = self._users[user_id] = (self.key(*cursor), user_id, score, cursor)
+        self._entries.add(entry)
+
+    def remove(self, user_id):
+        entry = self._users.pop(user_id, None)
+        if entry is not None:
+            self._entries.remove(entry)
+
+    def rank(self, user_id):
+        """1-based position of `user_id`, None if it is not ranked."""
+        entry = self._users.get(user_id)
+        if entry is None:
+            return None
+        return self._entries.index(entry) + 1
+
+    def page(self, start=0, stop=None):
+        """[(user_id, score)] of the positions start..stop (0-based, stop excluded)."""
+        return [entry[1:3] for entry in self._entries.islice(start, stop)]
+
+    def after(self, cursor=None, limit=None):
+        """
+        Keyset page: the `limit` rows ranked after the row of `cursor` (from the top
+        without it). Returns (position of the first row, [(user_id, score)], cursor of
+        the last row or None at the end of the leaderboard).
+        """
+        start = (
+            0 if cursor is None else self._entries.bisect_key_right(self.key(*cursor))
+        )
+        stop = None if limit is None else start + limit
+        entries = list(self._entries.islice(start, stop))
+        last = entries[-1][3] if entries and start + len(entries) < len(self) else None
+        return start, [entry[1:3] for entry in entries], last
+
+
+class LeaderboardIndex:
+    """
+    Public and private rankings of every user, updated as scores come in.
+
+    The public board ranks the best public score of each user, ties by user_id.
+    The private board ranks the submissions made before `close_time` as
+    `get_private_leaderboard` does: the best selected private score, or the private
+    score of the best public submission when nothing is selected.
+    Updates and reads are done under one lock: they only take O(log n) each.
+    """
+
+    def __init__(self, close_time, maximized_score=True):
+        self.close_time = close_time
+        self.maximized_score = maximized_score
+        self._lock = threading.Lock()
+        self._reset()
+
+    def _reset(self):
+        self.public = RankIndex(self._public_key)
+        self.private = RankIndex(self._private_key)
+        self._best_public = dict()  # user_id -> best public score
+        self._candidates = dict()  # user_id -> Candidate before the close
+        self._selected = dict()  # user_id -> best private score of the selection
+
+    def _score_key(self, score):
+        return -score if self.maximized_score else score
+
+    def _is_better(self, score, best):
+        return score > best if self.maximized_score else score < best
+
+    def _public_key(self, score, user_id):
+        return self._score_key(score), user_id
+
+    def _private_key(self, score, user_id, selected):
+        # ties: first the users with a selection, by user_id in the direction of the
+        # score, then the others by user_id desc
+        if selected and not self.maximized_score:
+            return self._score_key(score), 0, user_id
+        return self._score_key(score), 0 if selected else 1, Descending(user_id)
+
+    def rebuild(self, db):
+        """Loads every ranking from the database, e.g. at startup."""
+        summaries = db.session.query(
+            UserSummary.user_id,
+            UserSummary.best_public,
+            UserSummary.best_private_selected,
+        ).all()
+        evaluations = (
+            db.session.query(
+                Submission.user_id,
+                Submission.timestamp,
+                Evaluation.evaluation_public,
+                Evaluation.evaluation_private,
+            )
+            .join(Evaluation)
+            .filter(Submission.timestamp < self.close_time)
+            .order_by(Submission.timestamp, Submission.id)
+            .all()
+        )
+
+        with self._lock:
+            self._reset()
+            for user_id, public, private in summaries:
+                self._set_public(user_id, float(public))
+                if private is not None:
+                    self._selected[user_id] = float(private)
+            for user_id, timestamp, public, private in evaluations:
+                self._set_candidate(user_id, timestamp, float(public), float(private))
+            for user_id in self._candidates.keys() | self._selected.keys():
+                self._update_private(user_id)
+
+    def record(self, user_id, timestamp, public, private):
+        """
+        Ranks a new evaluation of `user_id`.
+
+        Returns (previous rank, new rank) on the public board if the best public score
+        of the user improved (the previous rank is None for a new user), else None.
+        """
+        public, private = float(public), float(private)
+        moved = None
+        with self._lock:
+            best = self._best_public.get(user_id)
+            if best is None or self._is_better(public, best):
+                previous_rank = self.public.rank(user_id)
+                self._set_public(user_id, public)
+                moved = previous_rank, self.public.rank(user_id)
+            if timestamp < self.close_time:
+                self._set_candidate(user_id, timestamp, public, private)
+                self._update_private(user_id)
+        return moved
+
+    def select(self, user_id, best_private_selected):
+        """Ranks `user_id` by the best private score of its selected submissions."""
+        with self._lock:
+            if best_private_selected is None:
+                self._selected.pop(user_id, None)
+            else:
+                self._selected[user_id] = float(best_private_selected)
+            self._update_private(user_id)
+
+    def _set_public(self, user_id, public):
+        self._best_public[user_id] = public
+        self.public.set(user_id, public)
+
+    def _set_candidate(self, user_id, timestamp, public, private):
+        candidate = self._candidates.get(user_id)
+        if (
+            candidate is None
+            or self._is_better(public, candidate.public)
+            or (public == candidate.public and timestamp >= candidate.timestamp)
+        ):
+            self._candidates[user_id] = Candidate(public, timestamp, private)
+
+    def _update_private(self, user_id):
+        selected = self._selected.get(user_id)
+        candidate = self._candidates.get(user_id)
+        if selected is not None:
+            self.private.set(user_id, selected, True)
+        elif candidate is not None:
+            self.private.set(user_id, candidate.private, False)
+        else:
+            self.private.remove(user_id)
+
+    def public_leaderboard(self, start=0, stop=None):
+        with self._lock:
+            page = self.public.page(start, stop)
+        return [(user_id, score_mapper(score)) for user_id, score in page]
+
+    def private_leaderboard(self, start=0, stop=None):
+        with self._lock:
+            page = self.private.page(start, stop)
+        return [(user_id, score_mapper(score)) for user_id, score in page]
+
+    def public_rank(self, user_id):
+        with self._lock:
+            return self.public.rank(user_id)
+
+    def private_rank(self, user_id):
+        with self._lock:
+            return self.private.rank(user_id)
+
+    def page(self, board, cursor=None, limit=None):
+        """
+        Keyset page of the "public" or "private" board, see `RankIndex.after`.
+
+        Returns (position of the first row, [(user_id, score)], cursor of the next page
+        or None). Cursors are opaque strings, raises if `cursor` is not valid.
+        """
+        index = self.public if board == "public" else self.private
+        try:
+            after = None if cursor is None else decode_cursor(cursor)
+            with self._lock:
+                start, rows, last = index.after(after, limit)
+        except (TypeError, ValueError):
+            raise Exception("Invalid cursor.")
+
+        rows = [(user_id, score_mapper(score)) for user_id, score in rows]
+        return start, rows, None if last is None else encode_cursor(last)
+
+    def public_neighbourhood(self, user_id, size):
+        """(position of the first row, [(user_id, score)]) of the `size` rows around `user_id`."""
+        with self._lock:
+            rank = self.public.rank(user_id)
+            if rank is None:
+                return 0, []
+            start = max(rank - 1 - size // 2, 0)
+            rows = self.public.page(start, start + size)
+        return start, [(user_id, score_mapper(score)) for user_id, score in rows]
+
+
+def encode_cursor(cursor):
+    return base64.urlsafe_b64encode(json.dumps(cursor).encode()).decode()
+
+
+def decode_cursor(token):
+    return tuple(json.loads(base64.urlsafe_b64decode(token.encode())))
@@ -0,0 +1,254 @@
+"""
+Re-scores every evaluated submission against the current solution file and metrics.
+
+Use it when the solution file or the metrics change during the competition. The stored
+files are scored by a pool of processes sharing the solution loaded before the fork,
+and the new scores are written in batched transactions together with a state file, so
+that an interrupted run resumes where it stopped. Run from the repository folder (the
+stored file names are relative to it):
+
+    python rescore.py [--dry-run] [--workers 4] [--batch-size 500]
+
+With --dry-run nothing is written: the submissions whose primary scores would change
+are listed instead. Restart the server afterwards to refresh its cached leaderboards.
+"""
+import argparse
+import hashlib
+import json
+import multiprocessing
+import os
+import time
+
+from flask import Flask
+from sqlalchemy import bindparam
+
+import db_engine
+import leaderboard_history
+from competition_tools import (
+    SolutionStore,
+    StageHandler,
+    evaluate_predictions,
+    evaluation_bootstrap_row,
+    evaluation_metric_rows,
+    read_predictions,
+    rebuild_user_summaries,
+    score_mapper,
+)
+from config import CompetitionConfig
+from evaluation_functions import metric_names, primary_metric, to_maximize
+from models import db, Evaluation, EvaluationBootstrap, EvaluationMetric, Submission
+
+# Solution loaded before the workers are forked, shared by all of them
+_solution = None
+
+
+def _rescore(job):
+    submission_id, filename = job
+    try:
+        y_pred = read_predictions(filename, _solution)
+        return submission_id, evaluate_predictions(y_pred, _solution), None
+    except Exception as ex:
+        return submission_id, None, f"{filename}: {ex}"
+
+
+def fingerprint(solution_file):
+    """Identifies the solution and metrics a state file was written for."""
+    digest = hashlib.sha256(json.dumps(metric_names).encode())
+    with open(solution_file, "rb") as f:
+        for block in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def load_state(state_file, solution_fingerprint):
+    if not os.path.exists(state_file):
+        return 0
+    with open(state_file) as f:
+        state = json.load(f)
+    if state["fingerprint"] != solution_fingerprint:
+        print("The solution or the metrics changed since the last run: starting over.")
+        return 0
+    print(f"Resuming after submission {state['last_submission_id']}.")
+    return state["last_submission_id"]
+
+
+def save_state(state_file, solution_fingerprint, last_submission_id):
+    with open(state_file + ".tmp", "w") as f:
+        json.dump(
+            dict(
+                fingerprint=solution_fingerprint,
+                last_submission_id=last_submission_id,
+            ),
+            f,
+        )
+    os.replace(state_file + ".tmp", state_file)
+
+
+def store_scores(db, results):
+    """Writes a batch of (submission_id, Scores) in one transaction."""
+    submission_ids = [s_id for s_id, _ in results]
+    db.session.execute(
+        Evaluation.__table__.update()
+        .where(Evaluation.submission_id == bindparam("s_id"))
+        .values(
+            evaluation_public=bindparam("public"),
+            evaluation_private=bindparam("private"),
+        ),
+        [
+            dict(
+                s_id=s_id,
+                public=scores.metrics[primary_metric][0],
+                private=scores.metrics[primary_metric][1],
+            )
+            for s_id, scores in results
+        ],
+    )
+    for model in [EvaluationMetric, EvaluationBootstrap]:
+        db.session.execute(
+            model.__table__.delete().where(model.submission_id.in_(submission_ids))
+        )
+    db.session.execute(
+        EvaluationMetric.__table__.insert(),
+        [
+            row
+            for s_id, scores in results
+            for row in evaluation_metric_rows(s_id, scores.metrics)
+        ],
+    )
+    bootstrap_rows = [
+        evaluation_bootstrap_row(s_id, scores.bootstrap)
+        for s_id, scores in results
+        if scores.bootstrap is not None
+    ]
+    if bootstrap_rows:
+        db.session.execute(EvaluationBootstrap.__table__.insert(), bootstrap_rows)
+    db.session.commit()
+
+
+def print_changes(db, results):
+    """Lists the submissions of a batch whose primary scores would change."""
+    evaluations = {
+        evaluation.submission_id: (evaluation, user_id)
+        for evaluation, user_id in db.session.query(Evaluation, Submission.user_id)
+        .join(Submission)
+        .filter(Evaluation.submission_id.in_([s_id for s_id, _ in results]))
+    }
+    changed = 0
+    for s_id, scores in results:
+        evaluation, user_id = evaluations[s_id]
+        old = (
+            score_mapper(evaluation.evaluation_public),
+            score_mapper(evaluation.evaluation_private),
+        )
+        new = tuple(score_mapper(score) for score in scores.metrics[primary_metric])
+        if old != new:
+            changed += 1
+            print(
+                f"    submission {s_id} ({user_id}): "
+                f"public {old[0]} -> {new[0]}, private {old[1]} -> {new[1]}"
+            )
+    return changed
+
+
+def rescore(db, solution_file, workers, batch_size, dry_run, state_file):
+    global _solution
+    _solution = SolutionStore(solution_file).get()
+    solution_fingerprint = fingerprint(solution_file)
+    start_after = 0 if dry_run else load_state(state_file, solution_fingerprint)
+
+    pool = multiprocessing.get_context("fork").Pool(workers)
+
+    jobs = (
+        db.session.query(Submission.id, Submission.filename)
+        .join(Evaluation)
+        .filter(Submission.id > start_after)
+        .order_by(Submission.id)
+        .all()
+    )
+    print(f"Re-scoring {len(jobs)} submissions with {workers} processes...")
+
+    done, changed, failed = 0, 0, []
+    start = time.perf_counter()
+    results = pool.imap(_rescore, [tuple(job) for job in jobs], chunksize=8)
+    try:
+        batch = []
+        for submission_id, scores, error in results:
+            done += 1
+            if error is None:
+                batch.append((submission_id, scores))
+            else:
+                failed.append(error)
+
+            if len(batch) == batch_size or done == len(jobs):
+                if dry_run:
+                    changed += print_changes(db, batch) if batch else 0
+                else:
+                    if batch:
+                        store_scores(db, batch)
+                    save_state(state_file, solution_fingerprint, submission_id)
+                batch = []
+
+                elapsed = time.perf_counter() - start
+                print(
+                    f"{done}/{len(jobs)} submissions re-scored "
+                    f"({done / elapsed:.1f}/s, {len(failed)} failed)"
+                )
+    finally:
+        pool.terminate()
+
+    for error in failed:
+        print(f"Failed: {error}")
+
+    if dry_run:
+        print(f"{changed} submissions would change their scores (dry run).")
+        return
+
+    stage_handler = StageHandler(
+        CompetitionConfig.OPEN_TIME,
+        CompetitionConfig.CLOSE_TIME,
+        CompetitionConfig.TERMINATE_TIME,
+    )
+    rebuild_user_summaries(db, stage_handler.close_time, maximized_score=to_maximize)
+    leaderboard_history.rebuild(db, maximized_score=to_maximize)
+    if os.path.exists(state_file):
+        os.remove(state_file)
+    print("Re-scoring completed. Restart the server to refresh the leaderboards.")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "--db",
+        type=str,
+        default=CompetitionConfig.DB_FILE,
+        help="The SQLAlchemy URL of the database (default config.DB_FILE)",
+    )
+    parser.add_argument(
+        "--solution",
+        type=str,
+        default=CompetitionConfig.TEST_FILE_PATH,
+        help="The solution file (default config.TEST_FILE_PATH)",
+    )
+    parser.add_argument("--workers", type=int, default=os.cpu_count())
+    parser.add_argument(
+        "--batch-size", type=int, default=500, help="Submissions per transaction"
+    )
+    parser.add_argument("--dry-run", action="store_true")
+    parser.add_argument(
+        "--state",
+        type=str,
+        default=os.path.join(CompetitionConfig.BASE_DIR, "rescore_state.json"),
+        help="The file recording the progress of an interrupted run",
+    )
+    args = parser.parse_args()
+
+    app = Flask(__name__)
+    app.config.from_object(CompetitionConfig)
+    app.config["SQLALCHEMY_DATABASE_URI"] = args.db
+    app.config["SQLALCHEMY_TRACK_MODIFICATIONS"] = False
+    db_engine.init_app(app, db)
+
+    with app.app_context():
+        rescore(
+            db, args.solution, args.workers, args.batch_size, args.dry_run, args.state
+        )
@@ -0,0 +1,96 @@
+import os
+import shutil
+import socket
+import subprocess
+
+import pytest
+from flask import Flask
+from sqlalchemy import create_engine, text
+
+os.sys.path.append("..")  # TODO change this when the project structure is changed
+from models import db as competition_db
+
+# Set to the URL of an empty PostgreSQL database to use it instead of a throwaway one
+POSTGRES_URL_ENV = "STADIO_TEST_POSTGRES_URL"
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("localhost", 0))
+        return s.getsockname()[1]
+
+
+@pytest.fixture(scope="session")
+def postgres_url(tmp_path_factory):
+    """A throwaway PostgreSQL server, started with the initdb/pg_ctl found on PATH."""
+    pytest.importorskip("psycopg2")
+    if os.environ.get(POSTGRES_URL_ENV):
+        yield os.environ[POSTGRES_URL_ENV]
+        return
+
+    initdb, pg_ctl = shutil.which("initdb"), shutil.which("pg_ctl")
+    if initdb is None or pg_ctl is None:
+        pytest.skip(
+            f"PostgreSQL not found: add its bin folder to PATH or set {POSTGRES_URL_ENV}"
+        )
+    if os.geteuid() == 0:
+        pytest.skip("PostgreSQL cannot be started by root")
+
+    base_dir = tmp_path_factory.mktemp("postgres")
+    data_dir, port = str(base_dir / "data"), free_port()
+    subprocess.run(
+        [initdb, "-D", data_dir, "-A", "trust", "-U", "postgres", "--no-sync"],
+        check=True,
+        capture_output=True,
+    )
+    subprocess.run(
+        [
+            pg_ctl,
+            "start",
+            "-w",
+            "-D",
+            data_dir,
+            "-l",
+            str(base_dir / "server.log"),
+            "-o",
+            f"-p {port} -k {base_dir} -c listen_addresses='' -c fsync=off",
+        ],
+        check=True,
+        capture_output=True,
+    )
+    try:
+        yield f"postgresql://postgres@/postgres?host={base_dir}&port={port}"
+    finally:
+        subprocess.run(
+            [pg_ctl, "stop", "-D", data_dir, "-m", "immediate"], capture_output=True
+        )
+
+
+@pytest.fixture(params=["sqlite", "postgresql"])
+def database_url(request, tmp_path):
+    """An empty database for every supported backend."""
+    if request.param == "sqlite":
+        yield "sqlite:///" + str(tmp_path / "test.db")
+        return
+
+    url = request.getfixturevalue("postgres_url")
+    yield url
+    engine = create_engine(url)
+    with engine.begin() as conn:
+        conn.execute(text("DROP SCHEMA public CASCADE"))
+        conn.execute(text("CREATE SCHEMA public"))
+    engine.dispose()
+
+
+@pytest.fixture
+def db(database_url):
+    app = Flask(__name__)
+    app.config["SQLALCHEMY_DATABASE_URI"] = database_url
+    app.config["SQLALCHEMY_TRACK_MODIFICATIONS"] = False
+    competition_db.init_app(app)
+
+    with app.app_context():
+        competition_db.create_all()
+        yield competition_db
+        competition_db.session.remove()
+        competition_db.engine.dispose()
@@ -38,3 +38,51 @@ def test_ApiAuth(roster_file):
 
     assert auth.get_api_key("11") == None
     assert auth.get_user("sakjldqww") == None
+
+
+def test_ApiAuth_reload(tmp_path, roster_file):
+    roster = tmp_path / "roster.tsv"
+    roster.write_text(open(roster_file).read())
+    auth = ApiAuth(str(roster))
+    mapping = auth.mapping
+
+    assert auth.reload() == False
+    roster.write_text(
+        open(roster_file).read() + "222222\tBIANCHI\tLUCA\tluca@example.com\tkey2\n"
+    )
+
+    assert auth.reload() == True
+    assert auth.get_user("key2") == "222222"
+    assert auth.is_valid_user("111111") == True
+    assert len(mapping) == 1  # a previous state is never modified
+
+
+def test_ApiAuth_empty_keys(tmp_path, roster_file):
+    roster = tmp_path / "roster.tsv"
+    roster.write_text(
+        open(roster_file).read()
+        + "222222\tBIANCHI\tLUCA\tluca@example.com\t\n"
+        + "\tVERDI\tANNA\tanna@example.com\tkey3\n"
+        + "333333\tNERI\tPAOLO\n"
+    )
+
+    for hash_keys in [False, True]:
+        auth = ApiAuth(str(roster), hash_keys=hash_keys)
+        assert len(auth.mapping) == 1
+        assert auth.is_valid_user("222222") == False
+        assert auth.is_valid_user("333333") == False
+        assert auth.is_valid_key("") == False
+        assert auth.get_user("") == None
+        assert auth.get_user("key3") == None
+
+
+def test_ApiAuth_hash_keys(roster_file):
+    auth = ApiAuth(roster_file, hash_keys=True)
+    api_key = "2bdfbb6f76b67ed8cbbbb1ae24e056e757a7d0e665a042c33dd7543bd4160abf"
+
+    assert api_key not in auth.reverse_mapping
+    assert auth.is_valid_key(api_key) == True
+    assert auth.get_user(api_key) == "111111"
+    assert auth.get_user(None) == None
+    with pytest.raises(Exception, match="stored hashed"):
+        auth.get_api_key("111111")
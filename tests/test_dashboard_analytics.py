@@ -0,0 +1,130 @@
+import datetime
+import json
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+from scipy.stats import trim_mean
+
+os.sys.path.append("..")  # TODO change this when the project structure is changed
+from competition_tools import (
+    StageHandler,
+    get_private_leaderboard,
+    record_evaluation,
+    score_mapper,
+)
+from dashboard_analytics import DashboardAnalytics, load_evaluations
+from models import Submission
+
+
+def random_evaluations(rng, n_users=20, n_evaluations=300):
+    return pd.DataFrame(
+        dict(
+            user_id=rng.choice([f"u{i:02d}" for i in range(n_users)], n_evaluations),
+            timestamp=pd.Timestamp(2020, 1, 1)
+            + pd.to_timedelta(rng.randint(0, 10 * 24 * 3600, n_evaluations), "s"),
+            public=np.round(rng.rand(n_evaluations), 2),  # with ties
+            private=rng.rand(n_evaluations),
+        )
+    )
+
+
+@pytest.mark.parametrize("maximized_score", [True, False])
+@pytest.mark.parametrize("seed", range(3))
+def test_DashboardAnalytics_matches_per_user_statistics(maximized_score, seed):
+    rng = np.random.RandomState(seed)
+    evaluations = random_evaluations(rng)
+    private_leaderboard = [(f"u{i:02d}", "0.000") for i in rng.permutation(20)][:-1]
+    best = max if maximized_score else min
+
+    analytics = DashboardAnalytics(
+        evaluations, private_leaderboard, maximized_score=maximized_score
+    )
+
+    # users without a private score are not listed
+    ranked_users = sorted(
+        {user_id for user_id, _ in private_leaderboard} & set(evaluations.user_id)
+    )
+    best_public = {
+        user_id: best(evaluations.public[evaluations.user_id == user_id])
+        for user_id in ranked_users
+    }
+    public_order = sorted(
+        ranked_users,
+        key=lambda user_id: (
+            (-best_public[user_id], user_id)
+            if maximized_score
+            else (best_public[user_id], user_id)
+        ),
+    )
+    assert [p["user_id"] for p in analytics.leaderboard.values()] == public_order
+
+    for user_id in ranked_users:
+        user_scores = evaluations[evaluations.user_id == user_id]
+        kpis = analytics.user_kpis(user_id)
+
+        assert kpis["pub_position"] == public_order.index(user_id) + 1
+        assert (
+            kpis["priv_position"]
+            == [u for u, _ in private_leaderboard].index(user_id) + 1
+        )
+        assert kpis["n_submissions"] == len(user_scores)
+        for column in ["public", "private"]:
+            assert kpis[f"max_{column}"] == score_mapper(best(user_scores[column]))
+            # up to the rounding of the displayed values
+            assert np.isclose(
+                float(kpis[f"avg_{column}"]),
+                trim_mean(user_scores[column], 0.1),
+                atol=1e-3,
+            )
+            assert np.isclose(
+                float(kpis[f"std_{column}"]), user_scores[column].std(), atol=1e-3
+            )
+
+        scores = list(json.loads(kpis["user_scores"]).values())
+        assert [s["public"] for s in scores] == sorted(
+            user_scores.public, reverse=maximized_score
+        )
+        daily_counts = (
+            user_scores.groupby(pd.Grouper(key="timestamp", freq="1D")).size().values
+        )
+        counts = json.loads(kpis["user_scores_sub_freq"]).values()
+        assert [c["count"] for c in counts] == list(daily_counts)
+
+    with pytest.raises(Exception, match="User unknown not found."):
+        analytics.user_kpis("unknown")
+
+
+def test_DashboardAnalytics_from_db(db):
+    stage_handler = StageHandler(
+        "2020/01/01 00:00:00", "2020/01/05 00:00:00", "2020/01/06 00:00:00"
+    )
+    for user_id, day, public, private in [
+        ("a", 1, 0.5, 0.9),
+        ("a", 3, 0.8, 0.2),
+        ("b", 2, 0.6, 0.7),
+    ]:
+        submission = Submission(
+            user_id=user_id,
+            filename=f"{user_id}.csv",
+            timestamp=datetime.datetime(2020, 1, day),
+        )
+        db.session.add(submission)
+        db.session.flush()
+        record_evaluation(db, submission, public, private)
+    db.session.commit()
+
+    # as in the app, which reads the private leaderboard from its LeaderboardIndex
+    analytics = DashboardAnalytics(
+        load_evaluations(db), get_private_leaderboard(db, stage_handler)
+    )
+
+    assert [p["user_id"] for p in analytics.leaderboard.values()] == ["a", "b"]
+    kpis = analytics.user_kpis("a")
+    assert (kpis["pub_position"], kpis["priv_position"]) == (1, 2)
+    assert kpis["max_public"] == "0.800"
+    assert kpis["priv_score_on_leaderboard"] == "0.200"
+    # the day without submissions between the two of "a" is shown as well
+    counts = json.loads(kpis["user_scores_sub_freq"]).values()
+    assert [c["count"] for c in counts] == [1, 0, 1]
@@ -0,0 +1,77 @@
+import datetime
+import hashlib
+import json
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+os.sys.path.append("..")  # TODO change this when the project structure is changed
+import db_dump
+from competition_tools import record_evaluation
+from models import Evaluation, Submission
+
+
+@pytest.fixture
+def competition(db):
+    for i in range(25):
+        submission = Submission(
+            user_id=f"user_{i % 4}",
+            filename=f"{i}.csv",
+            timestamp=datetime.datetime(2020, 1, 1, 0, i),
+        )
+        db.session.add(submission)
+        db.session.flush()
+        replicates = np.full(10, i / 25, dtype=np.float32)
+        record_evaluation(
+            db, submission, i / 25, 1 - i / 25, bootstrap=(0.0, 1.0, replicates)
+        )
+    db.session.commit()
+    return db
+
+
+@pytest.mark.parametrize("dump_format", ["csv", "csv.gz", "parquet"])
+def test_dump_database(competition, tmp_path, dump_format):
+    if dump_format == "parquet":
+        pytest.importorskip("pyarrow")
+
+    manifest_path = db_dump.dump_database(
+        competition.engine, "CLOSE", str(tmp_path), dump_format, chunk_size=7
+    )
+    with open(manifest_path) as f:
+        manifest = json.load(f)
+
+    assert manifest["stage"] == "CLOSE" and manifest["format"] == dump_format
+    assert {"submission", "evaluation", "user_summary"} <= set(manifest["tables"])
+    assert not [p for p in os.listdir(tmp_path) if p.endswith(".tmp")]
+
+    for t_name, table in manifest["tables"].items():
+        path = tmp_path / table["file"]
+        assert table["sha256"] == hashlib.sha256(path.read_bytes()).hexdigest()
+        if dump_format == "parquet":
+            t_df = pd.read_parquet(path)
+        else:
+            t_df = pd.read_csv(path)
+        assert len(t_df) == table["rows"]
+        if t_name == "evaluation":
+            assert list(t_df.columns) == [c.name for c in Evaluation.__table__.columns]
+            assert sorted(t_df["evaluation_public"]) == pytest.approx(
+                sorted(float(e.evaluation_public) for e in Evaluation.query)
+            )
+        if t_name == "evaluation_bootstrap":
+            replicates = t_df["replicates"]
+            if dump_format != "parquet":
+                replicates = replicates.map(bytes.fromhex)
+            assert sorted(
+                np.frombuffer(r, dtype=np.float32)[0] for r in replicates
+            ) == pytest.approx([i / 25 for i in range(25)])
+
+    assert manifest["tables"]["submission"]["rows"] == 25
+    assert manifest["tables"]["user_summary"]["rows"] == 4
+
+
+def test_dump_unknown_format(competition, tmp_path):
+    with pytest.raises(Exception, match="Unknown dump format"):
+        db_dump.dump_database(competition.engine, "CLOSE", str(tmp_path), "xlsx")
+    assert not [p for p in os.listdir(tmp_path) if p.endswith(".tmp")]
@@ -0,0 +1,46 @@
+import os
+
+from flask import Flask
+from sqlalchemy import text
+from sqlalchemy.pool import QueuePool
+
+os.sys.path.append("..")  # TODO change this when the project structure is changed
+import db_engine
+from config import CompetitionConfig
+from models import db
+
+
+def test_init_app_sqlite(tmp_path):
+    app = Flask(__name__)
+    app.config.from_object(CompetitionConfig)
+    app.config["SQLALCHEMY_DATABASE_URI"] = "sqlite:///" + str(tmp_path / "test.db")
+    app.config["SQLALCHEMY_TRACK_MODIFICATIONS"] = False
+    db_engine.init_app(app, db)
+
+    with app.app_context():
+        assert isinstance(db.engine.pool, QueuePool)
+        with db.engine.connect() as conn:
+            assert conn.execute(text("PRAGMA journal_mode")).scalar() == "wal"
+            assert conn.execute(text("PRAGMA synchronous")).scalar() == 1  # NORMAL
+            assert (
+                conn.execute(text("PRAGMA busy_timeout")).scalar()
+                == CompetitionConfig.SQLITE_PRAGMAS["busy_timeout"]
+            )
+
+
+def test_engine_options_memory():
+    assert db_engine.engine_options({"SQLALCHEMY_DATABASE_URI": "sqlite://"}) == {}
+
+
+def test_engine_options_server():
+    config = {
+        "SQLALCHEMY_DATABASE_URI": "postgresql://user@localhost/competition",
+        "DB_POOL_SIZE": 4,
+        "DB_MAX_OVERFLOW": 2,
+        "DB_CONNECT_ARGS": {"options": "-c search_path=lab1"},
+    }
+    options = db_engine.engine_options(config)
+
+    assert options["pool_size"] == 4 and options["max_overflow"] == 2
+    assert options["pool_pre_ping"]
+    assert options["connect_args"] == {"options": "-c search_path=lab1"}
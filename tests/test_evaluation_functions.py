@@ -0,0 +1,86 @@
+import os
+
+import numpy as np
+import pytest
+from sklearn import metrics
+
+os.sys.path.append("..")  # TODO change this when the project structure is changed
+from evaluation_functions import METRICS, bootstrap_interval, compute_metrics
+
+SKLEARN_METRICS = {
+    "accuracy": metrics.accuracy_score,
+    "balanced_accuracy": metrics.balanced_accuracy_score,
+    "f1_macro": lambda y_true, y_pred: metrics.f1_score(
+        y_true, y_pred, average="macro"
+    ),
+    "roc_auc": metrics.roc_auc_score,
+    "mae": metrics.mean_absolute_error,
+    "mse": metrics.mean_squared_error,
+    "rmse": lambda y_true, y_pred: np.sqrt(metrics.mean_squared_error(y_true, y_pred)),
+    "r2": metrics.r2_score,
+}
+
+
+@pytest.mark.parametrize("seed", range(3))
+def test_metrics_match_sklearn(seed):
+    rng = np.random.RandomState(seed)
+    classes = rng.randint(0, 4, 1000)
+    predicted_classes = np.where(rng.rand(1000) < 0.6, classes, rng.randint(0, 5, 1000))
+    binary = rng.randint(0, 2, 1000)
+    probabilities = np.round(0.3 * binary + 0.7 * rng.rand(1000), 2)  # with ties
+    values = rng.randn(1000)
+    predicted_values = values + 0.5 * rng.randn(1000)
+
+    names = set(METRICS)
+    for y_true, y_pred, kind in [
+        (classes, predicted_classes, ["accuracy", "balanced_accuracy", "f1_macro"]),
+        (binary, probabilities, ["roc_auc"]),
+        (values, predicted_values, ["mae", "mse", "rmse", "r2"]),
+    ]:
+        scores = compute_metrics(y_true, y_pred, kind)
+        for name in kind:
+            assert np.isclose(scores[name], SKLEARN_METRICS[name](y_true, y_pred))
+            assert np.isclose(METRICS[name](y_true, y_pred), scores[name])
+        names -= set(kind)
+    assert not names  # every metric is checked
+
+
+def test_metrics_many_predicted_labels():
+    # one distinct wrong label per row: a dense confusion matrix would not fit in memory
+    rng = np.random.RandomState(0)
+    n = 200_000
+    y_true = rng.randint(0, 4, n)
+    right = rng.rand(n) < 0.5
+    y_pred = np.where(right, y_true, 10 + np.arange(n))
+
+    scores = compute_metrics(y_true, y_pred, ["balanced_accuracy", "f1_macro"])
+    recall = np.array([right[y_true == c].mean() for c in range(4)])
+    assert np.isclose(scores["balanced_accuracy"], recall.mean())
+    # precision 1 on the true labels, f1 0 on each of the wrong labels
+    f1 = 2 * recall / (1 + recall)
+    assert np.isclose(scores["f1_macro"], f1.sum() / (4 + (~right).sum()))
+
+
+def test_metrics_length_mismatch():
+    with pytest.raises(Exception, match="2 predictions for 3 targets"):
+        compute_metrics(np.array([0, 1, 1]), np.array([0, 1]), ["accuracy"])
+
+
+def test_bootstrap_interval():
+    rng = np.random.RandomState(0)
+    y_true = rng.randint(0, 2, 400)
+    y_pred = np.where(rng.rand(400) < 0.8, y_true, 1 - y_true)
+    bank = rng.randint(0, 400, size=(200, 400))
+
+    low, high, replicates = bootstrap_interval(y_true, y_pred, bank, "accuracy")
+
+    expected = [METRICS["accuracy"](y_true[rows], y_pred[rows]) for rows in bank]
+    assert np.allclose(replicates, expected)
+    assert low < np.mean(y_true == y_pred) < high
+
+    # m-out-of-n: the replicates on 100 samples are rescaled to the spread on 400
+    _, _, rescaled = bootstrap_interval(y_true, y_pred, bank[:, :100], "accuracy")
+    raw = [METRICS["accuracy"](y_true[rows], y_pred[rows]) for rows in bank[:, :100]]
+    assert np.allclose(np.std(rescaled), np.std(raw) / 2)
+
+    assert bootstrap_interval(y_true, y_pred, bank, "f1_macro") is None
@@ -0,0 +1,138 @@
+import io
+import os
+import signal
+import threading
+
+import numpy as np
+import pytest
+from werkzeug.datastructures import FileStorage
+
+os.sys.path.append("..")  # TODO change this when the project structure is changed
+from competition_tools import (
+    SolutionStore,
+    accept_submission,
+    predictions_file,
+    queue_submission,
+)
+from config import CompetitionConfig
+from evaluation_functions import metric_names, primary_metric
+from evaluation_queue import EvaluationQueue
+from models import Submission, SubmissionStatus
+
+
+@pytest.fixture
+def solution_file(tmp_path):
+    path = tmp_path / "test_solution.csv"
+    path.write_text("Id,Predicted,Public\n0,0,0\n1,0,1\n2,0,2\n3,1,1\n")
+    return str(path)
+
+
+class StatusRecorder:
+    def __init__(self, expected_updates):
+        self.updates = []
+        self.expected_updates = expected_updates
+        self.done = threading.Event()
+
+    def __call__(self, submission_id, status, scores):
+        self.updates.append((submission_id, status, scores))
+        if len(self.updates) == self.expected_updates:
+            self.done.set()
+
+
+@pytest.mark.parametrize("workers", [0, 1])
+def test_EvaluationQueue(solution_file, workers):
+    recorder = StatusRecorder(expected_updates=4)
+    evaluation_queue = EvaluationQueue(solution_file, recorder, workers=workers)
+
+    # predictions in the solution layout: public only (ids 1, 3), both (2), private (0)
+    evaluation_queue.submit(1, np.array([0, 1, 1, 0]))
+    evaluation_queue.submit(2, np.array([0, 0]))  # misaligned, scoring fails
+
+    assert recorder.done.wait(timeout=30)
+    updates = sorted(recorder.updates, key=lambda u: (u[0], u[1] != "running"))
+    assert updates[0] == (1, SubmissionStatus.RUNNING, None)
+    assert updates[1][:2] == (1, SubmissionStatus.SCORED)
+    scores = updates[1][2]
+    assert set(scores.metrics) == set(metric_names)
+    assert np.allclose(scores.metrics[primary_metric], (2 / 3, 1 / 2))
+    low, high, replicates = scores.bootstrap
+    assert 0 <= low <= 2 / 3 <= high <= 1
+    assert updates[2] == (2, SubmissionStatus.RUNNING, None)
+    assert updates[3] == (2, SubmissionStatus.FAILED, None)
+
+
+def test_EvaluationQueue_full(solution_file):
+    blocked = threading.Event()
+
+    def on_status(submission_id, status, scores):
+        blocked.wait(timeout=30)
+
+    evaluation_queue = EvaluationQueue(
+        solution_file, on_status, workers=1, max_pending=1
+    )
+    y_pred = np.array([0, 0, 1, 1])
+    evaluation_queue.submit(1, y_pred)  # taken by the dispatcher
+    while evaluation_queue.pending():
+        pass
+    evaluation_queue.submit(2, y_pred)  # waiting in the queue
+
+    with pytest.raises(Exception, match="Too many submissions"):
+        evaluation_queue.submit(3, y_pred)
+    blocked.set()
+
+
+def test_EvaluationQueue_worker_killed(solution_file):
+    recorder = StatusRecorder(expected_updates=2)
+    evaluation_queue = EvaluationQueue(solution_file, recorder, workers=2)
+
+    # e.g. killed by the kernel when out of memory: the whole pool is broken
+    os.kill(next(iter(evaluation_queue._pool._processes)), signal.SIGKILL)
+    evaluation_queue.submit(1, np.array([0, 1, 1, 0]))
+    assert recorder.done.wait(timeout=30)
+    assert recorder.updates[1][:2] == (1, SubmissionStatus.SCORED)
+
+    # the later submissions are scored by the new workers
+    recorder.expected_updates, recorder.updates = 2, []
+    recorder.done.clear()
+    evaluation_queue.submit(2, np.array([0, 1, 1, 0]))
+    assert recorder.done.wait(timeout=30)
+    assert recorder.updates[1][:2] == (2, SubmissionStatus.SCORED)
+
+
+@pytest.mark.parametrize("keep_csv", [True, False])
+def test_EvaluationQueue_full_discards_upload(
+    db, solution_file, tmp_path, monkeypatch, keep_csv
+):
+    monkeypatch.setattr(CompetitionConfig, "KEEP_SUBMISSION_CSV", keep_csv)
+    blocked = threading.Event()
+    evaluation_queue = EvaluationQueue(
+        solution_file,
+        lambda submission_id, status, scores: blocked.wait(timeout=30),
+        workers=1,
+        max_pending=1,
+    )
+    y_pred = np.array([0, 0, 1, 1])
+    evaluation_queue.submit(1, y_pred)
+    while evaluation_queue.pending():
+        pass
+    evaluation_queue.submit(2, y_pred)
+
+    # the upload rejected by the full queue leaves neither files nor row behind
+    output_file = str(tmp_path / "upload.csv")
+    y_pred = accept_submission(
+        FileStorage(io.BytesIO(b"Id,Predicted\n3,1\n2,1\n1,0\n0,0\n")),
+        SolutionStore(solution_file).get(),
+        output_file,
+    )
+    assert os.path.exists(predictions_file(output_file))
+    assert os.path.exists(output_file) == keep_csv
+    submission = Submission(user_id="user", filename=output_file)
+    db.session.add(submission)
+    db.session.commit()
+
+    with pytest.raises(Exception, match="Too many submissions"):
+        queue_submission(db, evaluation_queue, submission, y_pred)
+    assert not os.path.exists(predictions_file(output_file))
+    assert not os.path.exists(output_file)
+    assert db.session.query(Submission).count() == 0
+    blocked.set()
@@ -0,0 +1,35 @@
+import os
+
+os.sys.path.append("..")  # TODO change this when the project structure is changed
+from leaderboard_cache import LeaderboardCache
+
+
+def test_LeaderboardCache():
+    cache = LeaderboardCache()
+    calls = []
+
+    def compute():
+        calls.append(cache.version)
+        return len(calls)
+
+    assert cache.get("table", compute) == 1
+    assert cache.get("table", compute) == 1
+    etag = cache.etag(False)
+    assert cache.etag(False) == etag
+    assert cache.etag(True) != etag
+
+    cache.invalidate()
+    assert cache.etag(False) != etag
+    assert cache.get("table", compute) == 2
+    assert calls == [0, 1]
+
+
+def test_LeaderboardCache_invalidated_while_computing():
+    cache = LeaderboardCache()
+
+    def compute():
+        cache.invalidate()  # an evaluation is committed meanwhile
+        return "stale"
+
+    assert cache.get("table", compute) == "stale"
+    assert cache.get("table", lambda: "fresh") == "fresh"
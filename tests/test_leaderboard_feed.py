@@ -0,0 +1,82 @@
+import os
+import threading
+
+os.sys.path.append("..")  # TODO change this when the project structure is changed
+from leaderboard_feed import LeaderboardFeed
+
+
+def event_ids(messages):
+    return [line[4:] for line in messages.split("\n") if line.startswith("id: ")]
+
+
+def test_LeaderboardFeed_broadcast():
+    feed = LeaderboardFeed(heartbeat=5)
+    streams = [feed.stream() for _ in range(3)]
+    assert [next(stream) for stream in streams] == ["retry: 5000\n\n"] * 3
+    assert feed.clients == 3
+
+    # the subscribers are all waiting for the next event
+    threading.Timer(0.1, feed.publish, ("delta",), dict(user_id="a", rank=1)).start()
+    for stream in streams:
+        message = next(stream)
+        assert message.startswith("id: ") and message.endswith(
+            'event: delta\ndata: {"user_id":"a","rank":1}\n\n'
+        )
+
+    for stream in streams:
+        stream.close()
+    assert feed.clients == 0
+
+
+def test_LeaderboardFeed_resume():
+    feed = LeaderboardFeed(buffer_size=3, heartbeat=0.01)
+    for rank in range(3):
+        feed.publish("delta", rank=rank)
+    first = event_ids("".join(event for _, event in feed._events))
+
+    stream = feed.stream(first[0])
+    next(stream)
+    assert event_ids(next(stream)) == first[1:]
+    assert next(stream) == ": keepalive\n\n"
+
+    # events no longer buffered, or of another server run
+    feed.publish("delta", rank=3)
+    feed.publish("delta", rank=4)
+    for last_event_id in [first[0], "0000-1", "garbage"]:
+        messages = list(feed.stream(last_event_id))
+        assert "event: reset" in messages[-1]
+    # a waiting client that falls behind the buffer is reset as well
+    for _ in range(3):
+        feed.publish("delta", rank=5)
+    assert "event: reset" in next(stream)
+
+
+def test_LeaderboardFeed_limits():
+    feed = LeaderboardFeed(max_clients=1, max_duration=0)
+    stream = feed.stream()
+    next(stream)
+
+    # over the limit, the client is only told to come back later
+    assert list(feed.stream()) == ["retry: 20000\n\n"]
+    assert feed.clients == 1
+
+    # the stream ends after max_duration: the client reconnects
+    assert list(stream) == []
+    assert feed.clients == 0
+
+
+def test_LeaderboardFeed_last_event_id():
+    feed = LeaderboardFeed(heartbeat=0.01)
+    feed.publish("delta", rank=1)
+    # a page rendered now, its stream opened after the next delta
+    last_event_id = feed.last_event_id
+    feed.publish("delta", rank=2)
+
+    stream = feed.stream(last_event_id)
+    next(stream)
+    assert event_ids(next(stream)) == [feed.last_event_id]
+    assert next(stream) == ": keepalive\n\n"
+    # without it, the stream starts from the current event
+    stream = feed.stream()
+    next(stream)
+    assert next(stream) == ": keepalive\n\n"
@@ -0,0 +1,115 @@
+import datetime
+import os
+import threading
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+from sqlalchemy.orm import Session
+
+os.sys.path.append("..")  # TODO change this when the project structure is changed
+import leaderboard_history
+from competition_tools import record_evaluation
+from config import CompetitionConfig
+from models import LeaderboardCheckpoint, LeaderboardDelta, Submission
+
+OPEN_TIME = datetime.datetime(2020, 1, 1)
+
+
+def expected_board(evaluations, time, maximized_score):
+    """The public leaderboard recomputed from all the evaluations made until `time`."""
+    board = dict()
+    for timestamp, user_id, score in evaluations:
+        if timestamp <= time:
+            best = board.get(user_id, score)
+            board[user_id] = max(best, score) if maximized_score else min(best, score)
+    return leaderboard_history.ranked(board, maximized_score)
+
+
+@pytest.mark.parametrize("maximized_score", [True, False])
+def test_board_as_of(db, monkeypatch, maximized_score):
+    monkeypatch.setattr(CompetitionConfig, "LEADERBOARD_CHECKPOINT_INTERVAL", 7)
+    rng = np.random.RandomState(0)
+    scores = [0.25, 0.5, 0.75, 1.0]  # few values, to have ties
+
+    # evaluations are recorded as they are scored, not in submission order
+    evaluations = []
+    for s in rng.permutation(150):
+        u = s % 20
+        submission = Submission(
+            user_id=f"user_{u}",
+            filename=f"user_{u}_{s}.csv",
+            timestamp=OPEN_TIME + datetime.timedelta(minutes=int(rng.randint(0, 600))),
+        )
+        db.session.add(submission)
+        db.session.flush()
+        public = float(rng.choice(scores))
+        record_evaluation(db, submission, public, 0.5, maximized_score)
+        db.session.commit()
+        evaluations.append((submission.timestamp, submission.user_id, public))
+
+    deltas = db.session.query(LeaderboardDelta).count()
+    assert 20 <= deltas < len(evaluations)
+    assert db.session.query(LeaderboardCheckpoint).count() == deltas // 7
+
+    times = [OPEN_TIME + datetime.timedelta(minutes=m) for m in range(-1, 620, 13)]
+
+    def check():
+        for time in times:
+            assert leaderboard_history.board_as_of(
+                db, time, maximized_score
+            ) == expected_board(evaluations, time, maximized_score)
+
+        for time, point in zip(
+            times, leaderboard_history.timeline(db, times, maximized_score)
+        ):
+            scores = [
+                score for _, score in expected_board(evaluations, time, maximized_score)
+            ]
+            assert point["time"] == time
+            assert point["participants"] == len(scores)
+            if scores:
+                assert point["best"] == scores[0]
+                assert point["median"] == np.median(scores)
+            else:
+                assert point["best"] is None and point["median"] is None
+
+    check()
+
+    # the replay in submission order only keeps the improvements
+    assert not leaderboard_history.backfill(db, maximized_score)
+    leaderboard_history.rebuild(db, maximized_score)
+    assert db.session.query(LeaderboardDelta).count() <= deltas
+    check()
+
+    db.session.query(LeaderboardCheckpoint).delete()
+    db.session.query(LeaderboardDelta).delete()
+    db.session.commit()
+    assert leaderboard_history.backfill(db, maximized_score)
+    check()
+
+
+def test_concurrent_checkpoint(db, monkeypatch):
+    monkeypatch.setattr(CompetitionConfig, "LEADERBOARD_CHECKPOINT_INTERVAL", 2)
+    second = SimpleNamespace(session=Session(db.engine))
+
+    def record(db, user_id, score):
+        submission = Submission(user_id=user_id, timestamp=OPEN_TIME)
+        return leaderboard_history.record_delta(db, submission, score)
+
+    # the first transaction appends delta 1, the second one delta 2 and the checkpoint
+    assert record(db, "a", 0.5).id == 1
+    second_done = threading.Thread(
+        target=lambda: (record(second, "b", 0.6), second.session.commit())
+    )
+    second_done.start()
+    second_done.join(0.5)
+    assert second_done.is_alive()  # waiting for the first one to commit
+    db.session.commit()
+    second_done.join(10)
+    second.session.close()
+
+    checkpoint = db.session.query(LeaderboardCheckpoint).one()
+    assert checkpoint.delta_id == 2
+    assert leaderboard_history.decode_board(checkpoint.board) == dict(a=0.5, b=0.6)
+    assert leaderboard_history.board_as_of(db, OPEN_TIME) == [("b", 0.6), ("a", 0.5)]
@@ -0,0 +1,70 @@
+import os
+
+import pytest
+from sqlalchemy import create_engine, inspect, text
+
+os.sys.path.append("..")  # TODO change this when the project structure is changed
+import migrations
+from models import db
+
+# Schema created by `db.create_all()` before any migration existed
+BASELINE_SCHEMA = [
+    """CREATE TABLE submission (
+        id INTEGER NOT NULL, user_id VARCHAR(32) NOT NULL,
+        timestamp TIMESTAMP NOT NULL, filename VARCHAR(128) NOT NULL,
+        PRIMARY KEY (id))""",
+    """CREATE TABLE evaluation (
+        submission_id INTEGER NOT NULL, evaluation_public NUMERIC NOT NULL,
+        evaluation_private NUMERIC NOT NULL, timestamp TIMESTAMP NOT NULL,
+        private_check BOOLEAN NOT NULL,
+        PRIMARY KEY (submission_id), FOREIGN KEY(submission_id) REFERENCES submission (id))""",
+]
+
+
+@pytest.fixture
+def engine(database_url):
+    engine = create_engine(database_url)
+    yield engine
+    engine.dispose()
+
+
+def applied_versions(engine):
+    with engine.connect() as conn:
+        return [v for v, in conn.execute(text("SELECT version FROM schema_version"))]
+
+
+def test_upgrade_baseline_database(engine):
+    with engine.begin() as conn:
+        for statement in BASELINE_SCHEMA:
+            conn.execute(text(statement))
+        conn.execute(
+            text(
+                "INSERT INTO submission VALUES (1, 'user', '2020-01-01 00:00:00', 'f.csv')"
+            )
+        )
+
+    db.metadata.create_all(engine)  # as the app does before upgrading
+    migrations.upgrade(engine)
+
+    inspector = inspect(engine)
+    assert "status" in [c["name"] for c in inspector.get_columns("submission")]
+    assert "ix_submission_user_id_timestamp" in [
+        i["name"] for i in inspector.get_indexes("submission")
+    ]
+    assert "ix_evaluation_private_check_submission_id" in [
+        i["name"] for i in inspector.get_indexes("evaluation")
+    ]
+    with engine.connect() as conn:
+        assert conn.execute(text("SELECT status FROM submission")).scalar() == "scored"
+    assert applied_versions(engine) == [v for v, _, _ in migrations.MIGRATIONS]
+
+    # already applied migrations are skipped
+    migrations.upgrade(engine)
+    assert applied_versions(engine) == [v for v, _, _ in migrations.MIGRATIONS]
+
+
+def test_upgrade_new_database(engine):
+    db.metadata.create_all(engine)
+    migrations.upgrade(engine)
+
+    assert applied_versions(engine) == [v for v, _, _ in migrations.MIGRATIONS]
@@ -0,0 +1,85 @@
+import datetime
+import os
+import threading
+
+import pytest
+
+os.sys.path.append("..")  # TODO change this when the project structure is changed
+from models import Submission, SubmissionStatus
+from quota_tracker import QuotaTracker
+
+START = datetime.datetime(2020, 1, 1)
+
+
+def at(seconds):
+    return START + datetime.timedelta(seconds=seconds)
+
+
+def test_QuotaTracker_limits():
+    tracker = QuotaTracker(time_between_submissions=60, max_submissions=2)
+
+    tracker.reserve("a", at(0))
+    with pytest.raises(Exception, match="Please try again in 50 seconds"):
+        tracker.reserve("a", at(10))
+    tracker.reserve("b", at(10))  # other users are not affected
+    tracker.reserve("a", at(60))
+    with pytest.raises(Exception, match="max submissions limit of 2"):
+        tracker.reserve("a", at(120))
+    assert tracker.submissions_left("a") == 0
+    assert tracker.submissions_left("c") == 2
+
+
+def test_QuotaTracker_release():
+    tracker = QuotaTracker(time_between_submissions=60, max_submissions=2)
+    tracker.reserve("a", at(0))
+
+    # a rejected upload gives back both the slot and the time limit
+    reservation = tracker.reserve("a", at(60))
+    tracker.release("a", reservation)
+    assert tracker.submissions_left("a") == 1
+    tracker.reserve("a", at(61))
+
+    # a failed evaluation gives back the slot only
+    tracker.release("a")
+    assert tracker.submissions_left("a") == 1
+    with pytest.raises(Exception, match="limit between submissions"):
+        tracker.reserve("a", at(62))
+
+
+def test_QuotaTracker_concurrent_reserve():
+    tracker = QuotaTracker(time_between_submissions=60, max_submissions=100)
+    barrier = threading.Barrier(8)
+    accepted = []
+
+    def upload():
+        barrier.wait()
+        try:
+            accepted.append(tracker.reserve("a", at(0)))
+        except Exception:
+            pass
+
+    threads = [threading.Thread(target=upload) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len(accepted) == 1
+    assert tracker.submissions_left("a") == 99
+
+
+def test_QuotaTracker_warm(db):
+    for i, status in enumerate(
+        [SubmissionStatus.SCORED, SubmissionStatus.FAILED, SubmissionStatus.QUEUED]
+    ):
+        db.session.add(
+            Submission(user_id="a", filename=f"{i}.csv", timestamp=at(i), status=status)
+        )
+    db.session.commit()
+
+    tracker = QuotaTracker(time_between_submissions=60, max_submissions=5)
+    tracker.warm(db)
+
+    assert tracker.submissions_left("a") == 3  # the failed one is not counted
+    with pytest.raises(Exception, match="Please try again in 58 seconds"):
+        tracker.reserve("a", at(4))
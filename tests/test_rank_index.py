@@ -0,0 +1,133 @@
+import datetime
+import os
+
+import numpy as np
+import pytest
+
+os.sys.path.append("..")  # TODO change this when the project structure is changed
+from competition_tools import (
+    StageHandler,
+    get_private_leaderboard,
+    get_public_leaderboard,
+    record_evaluation,
+    update_selected_private,
+)
+from models import Evaluation, Submission
+from rank_index import LeaderboardIndex, RankIndex
+
+
+def test_RankIndex():
+    index = RankIndex(lambda score, user_id: (-score, user_id))
+    for user_id, score in [("a", 0.5), ("b", 0.9), ("c", 0.7)]:
+        index.set(user_id, score)
+
+    assert index.page() == [("b", 0.9), ("c", 0.7), ("a", 0.5)]
+    assert [index.rank(u) for u in "abcd"] == [3, 1, 2, None]
+
+    index.set("a", 1.0)  # moved, not duplicated
+    assert index.page(0, 2) == [("a", 1.0), ("b", 0.9)]
+    assert index.page(2) == [("c", 0.7)]
+
+    # keyset pages continue after the last row, even if it moved in the meantime
+    assert index.after(limit=2) == (0, [("a", 1.0), ("b", 0.9)], (0.9, "b"))
+    index.set("b", 0.1)
+    assert index.after((0.9, "b"), limit=2) == (1, [("c", 0.7), ("b", 0.1)], None)
+
+    index.remove("b")
+    assert len(index) == 2 and index.rank("c") == 2
+
+
+def test_LeaderboardIndex_pages():
+    index = LeaderboardIndex(datetime.datetime(2020, 1, 2))
+    moves = [
+        index.record(f"user_{u}", datetime.datetime(2020, 1, 1), public, private)
+        for u, (public, private) in enumerate([(0.5, 0.5), (0.9, 0.5), (0.7, 0.5)])
+    ]
+    assert moves == [(None, 1), (None, 1), (None, 2)]
+    index.select("user_2", 0.5)
+
+    pages, cursor = [], None
+    while True:
+        start, rows, cursor = index.page("private", cursor, limit=2)
+        pages.append((start, rows))
+        if cursor is None:
+            break
+    # the selected user first, then by user_id desc
+    assert pages == [
+        (0, [("user_2", "0.500"), ("user_1", "0.500")]),
+        (2, [("user_0", "0.500")]),
+    ]
+    assert index.page("public", limit=5) == (
+        0,
+        [("user_1", "0.900"), ("user_2", "0.700"), ("user_0", "0.500")],
+        None,
+    )
+    assert index.public_neighbourhood("user_0", 2) == (1, index.page("public")[1][1:])
+
+    # the public rank only moves when the best public score improves
+    late = datetime.datetime(2020, 1, 3)
+    assert index.record("user_0", late, 0.6, 0.5) == (3, 3)
+    assert index.record("user_0", late, 0.55, 0.5) is None
+
+    for cursor in ["?", "WzFd", index.page("public", limit=1)[2]]:
+        with pytest.raises(Exception, match="Invalid cursor."):
+            index.page("private", cursor)
+
+
+@pytest.mark.parametrize("maximized_score", [True, False])
+@pytest.mark.parametrize("seed", range(3))
+def test_LeaderboardIndex_matches_queries(db, maximized_score, seed):
+    rng = np.random.RandomState(seed)
+    stage_handler = StageHandler(
+        "2020/01/01 00:00:00", "2020/01/02 00:00:00", "2020/01/03 00:00:00"
+    )
+    index = LeaderboardIndex(stage_handler.close_time, maximized_score=maximized_score)
+    scores = [0.25, 0.5, 0.75, 1.0]  # few values, to have ties
+
+    def check(index):
+        assert index.public_leaderboard() == get_public_leaderboard(
+            db, maximized_score=maximized_score
+        )
+        leaderboard = get_private_leaderboard(
+            db, stage_handler, maximized_score=maximized_score
+        )
+        assert index.private_leaderboard() == leaderboard
+        for position, (user_id, _) in enumerate(leaderboard, 1):
+            assert index.private_rank(user_id) == position
+
+    # evaluations are recorded as they are scored, not in submission order
+    for s in rng.permutation(200):
+        u = s % 30
+        submission = Submission(
+            user_id=f"user_{u}",
+            filename=f"user_{u}_{s}.csv",
+            timestamp=stage_handler.open_time
+            + datetime.timedelta(minutes=int(rng.randint(0, 1800)), seconds=int(s)),
+        )
+        db.session.add(submission)
+        db.session.flush()
+        public, private = rng.choice(scores), rng.choice(scores)
+        record_evaluation(db, submission, public, private, maximized_score)
+        db.session.commit()
+        index.record(submission.user_id, submission.timestamp, public, private)
+    check(index)
+
+    for u in range(0, 30, 3):
+        user_id = f"user_{u}"
+        for evaluation in (
+            db.session.query(Evaluation).join(Submission).filter_by(user_id=user_id)
+        ):
+            evaluation.private_check = bool(rng.rand() < 0.5)
+        db.session.flush()
+        index.select(
+            user_id,
+            update_selected_private(
+                db, user_id, stage_handler.close_time, maximized_score
+            ),
+        )
+        db.session.commit()
+    check(index)
+
+    rebuilt = LeaderboardIndex(stage_handler.close_time, maximized_score)
+    rebuilt.rebuild(db)
+    check(rebuilt)
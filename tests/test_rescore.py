@@ -0,0 +1,100 @@
+import datetime
+import json
+import os
+
+import pytest
+
+os.sys.path.append("..")  # TODO change this when the project structure is changed
+import rescore
+from competition_tools import record_evaluation
+from evaluation_functions import metric_names, primary_metric
+from models import (
+    Evaluation,
+    EvaluationBootstrap,
+    EvaluationMetric,
+    Submission,
+    UserSummary,
+)
+
+PREDICTIONS = {
+    "all_right": "Id,Predicted\n0,0\n1,0\n2,0\n3,1\n",
+    "all_wrong": "Id,Predicted\n0,1\n1,1\n2,1\n3,0\n",
+    "private_wrong": "Id,Predicted\n0,1\n1,0\n2,0\n3,1\n",
+}
+
+
+@pytest.fixture
+def competition(db, tmp_path):
+    solution_file = tmp_path / "test_solution.csv"
+    solution_file.write_text("Id,Predicted,Public\n0,0,0\n1,0,1\n2,0,2\n3,1,1\n")
+
+    for i, (name, content) in enumerate(PREDICTIONS.items()):
+        submission_file = tmp_path / f"{name}.csv"
+        submission_file.write_text(content)
+        submission = Submission(
+            user_id=name,
+            filename=str(submission_file),
+            timestamp=datetime.datetime(2020, 1, 1, i),
+        )
+        db.session.add(submission)
+        db.session.flush()
+        record_evaluation(db, submission, 0.5, 0.5)  # stale scores
+    db.session.commit()
+    return db, str(solution_file), str(tmp_path / "rescore_state.json")
+
+
+def scores(db):
+    return {
+        s.user_id: (float(e.evaluation_public), float(e.evaluation_private))
+        for s, e in db.session.query(Submission, Evaluation).join(Evaluation)
+    }
+
+
+def test_rescore_dry_run(competition, capsys):
+    db, solution_file, state_file = competition
+
+    rescore.rescore(db, solution_file, 1, 2, dry_run=True, state_file=state_file)
+
+    assert set(scores(db).values()) == {(0.5, 0.5)}
+    assert not os.path.exists(state_file)
+    output = capsys.readouterr().out
+    assert "(all_right): public 0.500 -> 1.000, private 0.500 -> 1.000" in output
+    assert "3 submissions would change their scores (dry run)." in output
+
+
+def test_rescore(competition):
+    db, solution_file, state_file = competition
+
+    rescore.rescore(db, solution_file, 1, 2, dry_run=False, state_file=state_file)
+
+    assert scores(db) == {
+        "all_right": (1.0, 1.0),
+        "all_wrong": (0.0, 0.0),
+        "private_wrong": (1.0, 0.5),
+    }
+    assert EvaluationMetric.query.count() == len(PREDICTIONS) * len(metric_names)
+    assert EvaluationBootstrap.query.count() == len(PREDICTIONS)
+    assert float(db.session.get(UserSummary, "all_wrong").best_public) == 0.0
+    assert not os.path.exists(state_file)
+
+
+def test_rescore_resume(competition):
+    db, solution_file, state_file = competition
+    first_id = db.session.query(Submission.id).filter_by(user_id="all_right").scalar()
+    with open(state_file, "w") as f:
+        json.dump(
+            dict(
+                fingerprint=rescore.fingerprint(solution_file),
+                last_submission_id=first_id,
+            ),
+            f,
+        )
+
+    rescore.rescore(db, solution_file, 1, 10, dry_run=False, state_file=state_file)
+
+    assert scores(db)["all_right"] == (0.5, 0.5)  # already re-scored before
+    assert scores(db)["all_wrong"] == (0.0, 0.0)
+    metrics = {
+        m.metric for m in EvaluationMetric.query.filter_by(submission_id=first_id)
+    }
+    assert primary_metric not in metrics